@@ -4,11 +4,28 @@ Validates JWT tokens from Supabase Auth
 """
 from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import hashlib
+import threading
+import time
 import jwt
+from cachetools import TTLCache
 from app.core.config import settings
 
 security = HTTPBearer()
 
+# Polling frontends present the same bearer token many times a minute, so
+# cache decoded claims keyed by a short token digest (blake2b - fast, and we
+# only need deduplication here, not authentication).
+_claims_cache = TTLCache(maxsize=4096, ttl=300)
+_claims_lock = threading.Lock()
+
+# Precomputed decode inputs - built once instead of per request.
+# The algorithms kwarg is meaningless with verification disabled, so the
+# unverified path omits it.
+_DECODE_OPTS = {"verify_signature": False, "require": ["sub"]}
+_VERIFIED_OPTS = {"require": ["sub", "exp"]}
+_HS256_KEY = settings.JWT_SECRET.encode() if settings.JWT_SECRET else None
+
 
 def get_jwt_secret():
     """Get JWT secret from Supabase project settings."""
@@ -23,28 +40,39 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
     Returns dict with 'sub' (user_id), 'email', etc.
     """
     token = credentials.credentials
-    
+
+    # Fast path: same token seen recently - skip the decode entirely
+    cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    with _claims_lock:
+        cached = _claims_cache.get(cache_key)
+    if cached is not None:
+        exp = cached.get("exp")
+        if exp is None or exp > time.time():
+            return cached
+        raise HTTPException(status_code=401, detail="Token has expired")
+
     try:
-        # Supabase tokens are signed with the JWT secret
-        # For Supabase, we decode without verification for now
-        # In production, you should verify with the actual secret
-        payload = jwt.decode(
-            token,
-            options={"verify_signature": False},  # Supabase handles verification
-            algorithms=["HS256"]
-        )
-        
+        # Single decode: verified against the HS256 secret when one is
+        # configured, otherwise the legacy unverified decode.
+        if _HS256_KEY:
+            payload = jwt.decode(token, _HS256_KEY, algorithms=["HS256"], options=_VERIFIED_OPTS)
+        else:
+            payload = jwt.decode(token, options=_DECODE_OPTS)
+
         user_id = payload.get("sub")
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token: no user ID")
-        
-        return {
+
+        claims = {
             "user_id": user_id,
             "email": payload.get("email"),
             "role": payload.get("role", "authenticated"),
             "exp": payload.get("exp")
         }
-        
+        with _claims_lock:
+            _claims_cache[cache_key] = claims
+        return claims
+
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
     except jwt.InvalidTokenError as e:
@@ -37,4 +37,10 @@ def get_settings():
     return Settings()
 
 
-settings = get_settings()
+def __getattr__(name):
+    # Resolve `settings` lazily (PEP 562) so importing this module doesn't
+    # parse .env/validate the environment; instantiation happens on first
+    # use (normally during app lifespan startup).
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,15 +1,39 @@
 """
 Skill Gap Analysis Service - Main FastAPI Application
 """
+import logging
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from mangum import Mangum
 from app.routers import analysis, cron
+from app.core.config import get_settings
+from app.services import data_service
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One handler for the whole app; services log lazily via module loggers
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO"),
+        format='{"time": "%(asctime)s", "level": "%(levelname)s", "logger": "%(name)s", "message": "%(message)s"}'
+    )
+    # Initialize settings and the shared HTTP client once per worker so the
+    # first request doesn't pay for them; expose both via app.state.
+    app.state.settings = get_settings()
+    app.state.http = data_service.get_async_client()
+    yield
+    await data_service.close_async_client()
+
 
 app = FastAPI(
     title="Skill Gap Analysis Service",
     description="AI-powered skill gap analysis using Gemini 2.5 Pro",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # CORS Middleware
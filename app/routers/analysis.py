@@ -1,11 +1,14 @@
 """
 Analysis Router - Main endpoints for skill gap analysis
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Optional
 from app.core.auth import get_current_user_id
 from app.services.data_service import (
+    fetch_analysis_history,
+    fetch_latest_analysis,
+    fetch_user_reports,
     get_user_profile,
     get_user_preferred_roles,
     get_user_skills,
@@ -17,11 +20,13 @@ from app.services.data_service import (
     set_preferred_roles,
     save_user_api_key
 )
-from app.services.gemini_service import analyze_skill_gap
-from app.services.pdf_service import generate_pdf_report, upload_to_s3, upload_to_supabase_storage
 from datetime import datetime, timezone
+import asyncio
+import logging
 import uuid
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
@@ -38,7 +43,8 @@ class ApiKeyRequest(BaseModel):
 
 
 @router.post("/generate")
-def generate_analysis(
+async def generate_analysis(
+    background: BackgroundTasks,
     request: AnalysisRequest = None,
     user_id: str = Depends(get_current_user_id)
 ):
@@ -47,42 +53,58 @@ def generate_analysis(
     This is the main endpoint called by frontend button click.
     """
     try:
-        # 1. Get user profile
-        profile = get_user_profile(user_id)
+        # 1-4. Fetch profile, roles, skills and market data concurrently -
+        # all six Supabase reads are independent, so latency is max(RTT)
+        # instead of the sum.
+        (
+            profile,
+            saved_roles,
+            user_skills,
+            skill_trends,
+            recent_jobs,
+            recent_discussions
+        ) = await asyncio.gather(
+            get_user_profile(user_id),
+            get_user_preferred_roles(user_id),
+            get_user_skills(user_id),
+            get_skill_trends(limit=30),
+            get_recent_jobs(limit=50),
+            get_recent_discussions(limit=30)
+        )
+
         if not profile:
             raise HTTPException(status_code=404, detail="User profile not found")
-        
+
         user_name = profile.get("full_name", "User")
         user_email = profile.get("email", "")
-        
-        # 2. Get preferred roles (from request or database)
+
+        # Preferred roles come from the request body or fall back to saved ones
         if request and request.preferred_roles:
             preferred_roles = request.preferred_roles[:3]
-            # Save the roles for future use
-            set_preferred_roles(user_id, preferred_roles)
+            # Save the roles for future use - sync requests helper, so keep
+            # it off the event loop
+            await asyncio.to_thread(set_preferred_roles, user_id, preferred_roles)
         else:
-            preferred_roles = get_user_preferred_roles(user_id)
+            preferred_roles = saved_roles
             if not preferred_roles:
                 raise HTTPException(
                     status_code=400,
                     detail="No preferred roles set. Please set your target roles first."
                 )
-        
-        # 3. Get user's skills (from resume and GitHub)
-        user_skills = get_user_skills(user_id)
+
         if not user_skills:
             raise HTTPException(
                 status_code=400,
                 detail="No skills found. Please connect GitHub or upload resume first."
             )
-        
-        # 4. Get market data
-        skill_trends = get_skill_trends(limit=30)
-        recent_jobs = get_recent_jobs(limit=50)
-        recent_discussions = get_recent_discussions(limit=30)
-        
+
+        # Heavy SDKs (genai, reportlab) are imported here so the lightweight
+        # endpoints don't pay for them on cold start
+        from app.services.gemini_service import analyze_skill_gap
+        from app.services.pdf_service import render_and_upload_report
+
         # 5. Run Gemini analysis
-        analysis = analyze_skill_gap(
+        analysis = await analyze_skill_gap(
             user_id=user_id,
             user_name=user_name,
             user_email=user_email,
@@ -93,36 +115,36 @@ def generate_analysis(
             recent_discussions=recent_discussions
         )
         
-        # 6. Store analysis result
-        analysis_id = store_analysis_result(user_id, preferred_roles, analysis)
+        # 6. Store analysis result after the response is sent - the id is
+        # generated client-side so the frontend still gets it immediately
+        analysis_id = str(uuid.uuid4())
+        background.add_task(store_analysis_result, user_id, preferred_roles, analysis, analysis_id)
         
-        # 7. Generate PDF report
-        pdf_buffer = generate_pdf_report(
+        # 7-8. Build the PDF and upload it - streamed straight into S3
+        # when configured, buffered with the storage fallback otherwise
+        now = datetime.now(timezone.utc)
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
+        filename = f"skill_gap_report_{user_id}_{timestamp}.pdf"
+
+        report_url, pdf_size = await render_and_upload_report(
             user_name=user_name,
             user_email=user_email,
             preferred_roles=preferred_roles,
             analysis=analysis,
-            user_skills=user_skills
+            user_skills=user_skills,
+            filename=filename
         )
         
-        # 8. Upload PDF to storage
-        timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-        filename = f"skill_gap_report_{user_id}_{timestamp}.pdf"
-        
-        # Get PDF size before upload
-        pdf_buffer.seek(0, 2)  # Seek to end
-        pdf_size = pdf_buffer.tell()
-        pdf_buffer.seek(0)  # Reset to beginning
-        
-        report_url = upload_to_supabase_storage(pdf_buffer, filename)
-        
-        # 9. Store report record
-        report_id = store_report_record(
+        # 9. Store report record (also deferred past the response)
+        report_id = str(uuid.uuid4())
+        background.add_task(
+            store_report_record,
             user_id=user_id,
             analysis_id=analysis_id,
             report_filename=filename,
             report_url=report_url,
-            report_size=pdf_size
+            report_size=pdf_size,
+            report_id=report_id
         )
         
         return {
@@ -143,43 +165,27 @@ def generate_analysis(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error generating analysis: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error generating analysis for user %s", user_id)
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 
 @router.get("/latest")
-def get_latest_analysis(user_id: str = Depends(get_current_user_id)):
+async def get_latest_analysis(user_id: str = Depends(get_current_user_id)):
     """Get the user's most recent skill gap analysis."""
-    from app.services.data_service import SUPABASE_REST_URL, HEADERS
-    import requests
-    
-    url = f"{SUPABASE_REST_URL}/skill_gap_analyses?user_id=eq.{user_id}&select=*&order=analyzed_at.desc&limit=1"
-    response = requests.get(url, headers=HEADERS, timeout=10)
-    
-    if response.status_code == 200 and response.json():
-        return response.json()[0]
-    
+    analysis = await fetch_latest_analysis(user_id)
+    if analysis:
+        return analysis
+
     raise HTTPException(status_code=404, detail="No analysis found")
 
 
 @router.get("/history")
-def get_analysis_history(
+async def get_analysis_history(
     limit: int = 10,
     user_id: str = Depends(get_current_user_id)
 ):
     """Get history of user's skill gap analyses."""
-    from app.services.data_service import SUPABASE_REST_URL, HEADERS
-    import requests
-    
-    url = f"{SUPABASE_REST_URL}/skill_gap_analyses?user_id=eq.{user_id}&select=id,target_job_title,gap_percentage,role_fit_score,analyzed_at&order=analyzed_at.desc&limit={limit}"
-    response = requests.get(url, headers=HEADERS, timeout=10)
-    
-    if response.status_code == 200:
-        return {"analyses": response.json()}
-    
-    return {"analyses": []}
+    return {"analyses": await fetch_analysis_history(user_id, limit)}
 
 
 @router.post("/roles")
@@ -196,9 +202,9 @@ def set_user_preferred_roles(
 
 
 @router.get("/roles")
-def get_user_roles(user_id: str = Depends(get_current_user_id)):
+async def get_user_roles(user_id: str = Depends(get_current_user_id)):
     """Get user's preferred job roles."""
-    roles = get_user_preferred_roles(user_id)
+    roles = await get_user_preferred_roles(user_id)
     return {"roles": roles}
 
 
@@ -224,18 +230,9 @@ def set_gemini_api_key(
 
 
 @router.get("/reports")
-def get_user_reports(
+async def get_user_reports(
     limit: int = 10,
     user_id: str = Depends(get_current_user_id)
 ):
     """Get user's generated reports."""
-    from app.services.data_service import SUPABASE_REST_URL, HEADERS
-    import requests
-    
-    url = f"{SUPABASE_REST_URL}/reports?user_id=eq.{user_id}&select=id,report_filename,report_url,generated_at,email_sent,email_sent_at&order=generated_at.desc&limit={limit}"
-    response = requests.get(url, headers=HEADERS, timeout=10)
-    
-    if response.status_code == 200:
-        return {"reports": response.json()}
-    
-    return {"reports": []}
+    return {"reports": await fetch_user_reports(user_id, limit)}
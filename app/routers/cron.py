@@ -3,141 +3,192 @@ CRON Router - Weekly scheduled skill gap analysis for all users
 """
 from fastapi import APIRouter, HTTPException
 from app.services.data_service import (
+    analysis_needed_from_timestamps,
+    clear_market_cache,
     get_all_users_for_cron,
-    get_user_profile,
-    get_user_preferred_roles,
-    get_user_skills,
+    get_analysis_decision_data_bulk,
+    get_preferred_roles_bulk,
     get_skill_trends,
+    get_skills_bulk,
     get_recent_discussions,
     store_analysis_result,
-    store_report_record,
-    check_if_analysis_needed
+    store_report_record
 )
-from app.services.gemini_service import analyze_skill_gap
-from app.services.pdf_service import generate_pdf_report, upload_to_supabase_storage
 from datetime import datetime, timezone
-import traceback
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# The per-user pipeline is almost entirely I/O-bound (Supabase RTTs,
+# Gemini call, PDF upload), so process users concurrently with a bounded
+# fan-out. The Gemini semaphore keeps us inside the AI Studio rate budget.
+CRON_WORKERS = int(os.getenv("CRON_WORKERS", "8"))
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "4"))
+
+_gemini_semaphore = asyncio.Semaphore(GEMINI_CONCURRENCY)
+
+
+async def _process_user(
+    user: dict,
+    preferred_roles: list[str],
+    user_skills: list[dict],
+    needs_analysis: bool,
+    skill_trends: list[dict],
+    recent_discussions: list[dict]
+) -> dict:
+    """Run the full analysis pipeline for one user. Returns a result dict."""
+    # Imported lazily so /status and /invalidate-cache never load the heavy SDKs
+    from app.services.gemini_service import analyze_skill_gap
+    from app.services.pdf_service import render_and_upload_report
+
+    user_id = user.get("id")
+    user_name = user.get("full_name", "User")
+    user_email = user.get("email", "")
+
+    # Check if analysis is needed (Smart Cron)
+    if not needs_analysis:
+        return {
+            "user_id": user_id,
+            "status": "skipped",
+            "reason": "No new data (Resume/GitHub unchanged)"
+        }
+
+    if not preferred_roles:
+        return {
+            "user_id": user_id,
+            "status": "skipped",
+            "reason": "No preferred roles set"
+        }
+
+    if not user_skills:
+        return {
+            "user_id": user_id,
+            "status": "skipped",
+            "reason": "No skills found"
+        }
+
+    # Run analysis
+    async with _gemini_semaphore:
+        analysis = await analyze_skill_gap(
+            user_id=user_id,
+            user_name=user_name,
+            user_email=user_email,
+            preferred_roles=preferred_roles,
+            user_skills=user_skills,
+            market_trends=skill_trends,
+            trending_skills=skill_trends,
+            recent_discussions=recent_discussions
+        )
+
+    # Store analysis
+    analysis_id = await asyncio.to_thread(store_analysis_result, user_id, preferred_roles, analysis)
+
+    # Generate and upload PDF
+    now = datetime.now(timezone.utc)
+    timestamp = now.strftime("%Y%m%d_%H%M%S")
+    filename = f"skill_gap_report_{user_id}_{timestamp}.pdf"
+
+    report_url, pdf_size = await render_and_upload_report(
+        user_name=user_name,
+        user_email=user_email,
+        preferred_roles=preferred_roles,
+        analysis=analysis,
+        user_skills=user_skills,
+        filename=filename
+    )
+
+    # Store report record
+    report_id = await asyncio.to_thread(
+        store_report_record,
+        user_id=user_id,
+        analysis_id=analysis_id,
+        report_filename=filename,
+        report_url=report_url,
+        report_size=pdf_size
+    )
+
+    return {
+        "user_id": user_id,
+        "status": "success",
+        "analysis_id": analysis_id,
+        "report_id": report_id,
+        "overall_fit_score": analysis.get("overall_fit_score", 0)
+    }
+
 
 @router.post("/run")
-def run_weekly_analysis():
+async def run_weekly_analysis():
     """
     CRON endpoint - Run weekly skill gap analysis for ALL users.
     This is triggered by AWS EventBridge scheduler.
     """
     results = []
     errors = []
-    
-    # Get all users who should receive weekly reports
-    users = get_all_users_for_cron()
-    
+
+    # Get all users who should receive weekly reports (sync requests
+    # helper, so keep it off the event loop)
+    users = await asyncio.to_thread(get_all_users_for_cron)
+
     if not users:
         return {
             "status": "completed",
             "message": "No users to process",
             "processed": 0
         }
-    
-    # Get shared market data (same for all users)
-    skill_trends = get_skill_trends(limit=30)
-    recent_discussions = get_recent_discussions(limit=30)
-    
-    for user in users:
-        user_id = user.get("id")
-        user_name = user.get("full_name", "User")
-        user_email = user.get("email", "")
-        
-        try:
-            # Check if analysis is needed (Smart Cron)
-            if not check_if_analysis_needed(user_id):
-                results.append({
-                    "user_id": user_id,
-                    "status": "skipped",
-                    "reason": "No new data (Resume/GitHub unchanged)"
-                })
-                continue
-
-            # Get user-specific data
-            preferred_roles = get_user_preferred_roles(user_id)
-            if not preferred_roles:
-                results.append({
-                    "user_id": user_id,
-                    "status": "skipped",
-                    "reason": "No preferred roles set"
-                })
-                continue
-            
-            user_skills = get_user_skills(user_id)
-            if not user_skills:
-                results.append({
-                    "user_id": user_id,
-                    "status": "skipped",
-                    "reason": "No skills found"
-                })
-                continue
-            
-            # Run analysis
-            analysis = analyze_skill_gap(
-                user_id=user_id,
-                user_name=user_name,
-                user_email=user_email,
-                preferred_roles=preferred_roles,
-                user_skills=user_skills,
-                market_trends=skill_trends,
-                trending_skills=skill_trends,
-                recent_discussions=recent_discussions
-            )
-            
-            # Store analysis
-            analysis_id = store_analysis_result(user_id, preferred_roles, analysis)
-            
-            # Generate PDF
-            pdf_buffer = generate_pdf_report(
-                user_name=user_name,
-                user_email=user_email,
-                preferred_roles=preferred_roles,
-                analysis=analysis,
-                user_skills=user_skills
-            )
-            
-            # Upload PDF
-            timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-            filename = f"skill_gap_report_{user_id}_{timestamp}.pdf"
-            
-            pdf_buffer.seek(0, 2)
-            pdf_size = pdf_buffer.tell()
-            pdf_buffer.seek(0)
-            
-            report_url = upload_to_supabase_storage(pdf_buffer, filename)
-            
-            # Store report record
-            report_id = store_report_record(
-                user_id=user_id,
-                analysis_id=analysis_id,
-                report_filename=filename,
-                report_url=report_url,
-                report_size=pdf_size
+
+    # Fetch shared market data plus every user's roles, skills and skip-check
+    # timestamps in a handful of bulk queries (in.(...) filters) instead of
+    # 3-5 round trips per user.
+    user_ids = [u["id"] for u in users if u.get("id")]
+    (
+        skill_trends,
+        recent_discussions,
+        roles_by_user,
+        skills_by_user,
+        decision_by_user
+    ) = await asyncio.gather(
+        get_skill_trends(limit=30),
+        get_recent_discussions(limit=30),
+        get_preferred_roles_bulk(user_ids),
+        get_skills_bulk(user_ids),
+        get_analysis_decision_data_bulk(user_ids)
+    )
+
+    worker_limit = asyncio.Semaphore(CRON_WORKERS)
+
+    async def bounded_process(user: dict):
+        uid = user.get("id")
+        async with worker_limit:
+            return await _process_user(
+                user,
+                roles_by_user.get(uid, []),
+                skills_by_user.get(uid, []),
+                analysis_needed_from_timestamps(decision_by_user.get(uid, {})),
+                skill_trends,
+                recent_discussions
             )
-            
-            results.append({
-                "user_id": user_id,
-                "status": "success",
-                "analysis_id": analysis_id,
-                "report_id": report_id,
-                "overall_fit_score": analysis.get("overall_fit_score", 0)
-            })
-            
-        except Exception as e:
-            error_msg = str(e)[:100]
-            print(f"Error processing user {user_id}: {error_msg}")
-            traceback.print_exc()
+
+    outcomes = await asyncio.gather(
+        *(bounded_process(user) for user in users),
+        return_exceptions=True
+    )
+
+    for user, outcome in zip(users, outcomes):
+        if isinstance(outcome, Exception):
+            user_id = user.get("id")
+            error_msg = str(outcome)[:100]
+            logger.error("Processing user %s failed", user_id, exc_info=outcome)
             errors.append({
                 "user_id": user_id,
                 "error": error_msg
             })
-    
+        else:
+            results.append(outcome)
+
     return {
         "status": "completed",
         "processed": len(results),
@@ -148,11 +199,21 @@ def run_weekly_analysis():
     }
 
 
+@router.post("/invalidate-cache")
+def invalidate_market_cache():
+    """
+    Invalidate the cached market data.
+    Called after the trend service pipeline finishes populating fresh data.
+    """
+    clear_market_cache()
+    return {"status": "success", "message": "Market data cache cleared"}
+
+
 @router.get("/status")
-def get_cron_status():
+async def get_cron_status():
     """Get status of the CRON job configuration."""
-    users = get_all_users_for_cron()
-    trends = get_skill_trends(limit=5)
+    users = await asyncio.to_thread(get_all_users_for_cron)
+    trends = await get_skill_trends(limit=5)
     
     return {
         "status": "ready",
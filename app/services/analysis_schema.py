@@ -0,0 +1,83 @@
+"""
+Typed schema for the skill gap analysis payload.
+Kept free of heavy imports so both the Gemini side and the PDF renderer
+can share it; every field has a default, so even a degraded payload
+(e.g. a parse_error blob) validates into a renderable object.
+
+The *Response models describe what the model is asked to emit and omit
+the derived numeric fields (gap percentages, fit score, timestamp) -
+those are computed locally after parsing and only exist on the
+render-side models.
+"""
+from typing import Optional
+from pydantic import BaseModel
+
+
+class MarketTrends(BaseModel):
+    top_skills: list[str] = []
+    growing_technologies: list[str] = []
+    market_direction: str = "N/A"
+    key_statistics: list[str] = []
+
+
+class SkillAssessment(BaseModel):
+    strong_skills: list[str] = []
+    needs_improvement: list[str] = []
+    market_readiness_score: Optional[float] = None
+    assessment_notes: str = ""
+
+
+class RoleGapResponse(BaseModel):
+    role: str = "Unknown Role"
+    required_skills: list[str] = []
+    user_has: list[str] = []
+    user_missing: list[str] = []
+
+
+class RoleGap(RoleGapResponse):
+    gap_percentage: float = 0
+
+
+class CriticalSkill(BaseModel):
+    skill: str = ""
+    importance: str = ""
+    learning_difficulty: str = ""
+    reason: str = ""
+
+
+class Recommendations(BaseModel):
+    immediate_actions: list[str] = []
+    short_term_goals: list[str] = []
+    long_term_strategy: str = ""
+
+
+class LearningResource(BaseModel):
+    skill: str = ""
+    free_resources: list[str] = []
+    paid_courses: list[str] = []
+    certifications: list[str] = []
+    project_ideas: list[str] = []
+
+
+class CompetitivenessScore(BaseModel):
+    role: str = ""
+    score: float = 0
+    explanation: str = ""
+
+
+class SkillAnalysisResponse(BaseModel):
+    executive_summary: str = "No summary available."
+    market_trends: MarketTrends = MarketTrends()
+    skill_assessment: SkillAssessment = SkillAssessment()
+    gap_analysis: list[RoleGapResponse] = []
+    critical_missing_skills: list[CriticalSkill] = []
+    recommendations: Recommendations = Recommendations()
+    learning_resources: list[LearningResource] = []
+    competitiveness_scores: list[CompetitivenessScore] = []
+    key_insights: list[str] = []
+
+
+class SkillAnalysis(SkillAnalysisResponse):
+    gap_analysis: list[RoleGap] = []
+    overall_gap_percentage: float = 0
+    overall_fit_score: int = 0
@@ -1,73 +1,353 @@
 """
 Data Service - Fetches all required data from Supabase for skill gap analysis
 """
+import asyncio
+import hashlib
+import logging
+import orjson
+import types
+import threading
+import httpx
+import ciso8601
 import requests
+from cachetools import TTLCache
+from cachetools.keys import hashkey
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from app.core.config import settings
 from datetime import datetime, timezone
 
+logger = logging.getLogger(__name__)
+
 SUPABASE_REST_URL = f"{settings.SUPABASE_URL}/rest/v1"
-HEADERS = {
+HEADERS = types.MappingProxyType({
     "apikey": settings.SUPABASE_KEY,
     "Authorization": f"Bearer {settings.SUPABASE_KEY}",
     "Content-Type": "application/json"
-}
+})
+
+# Prefer-header variants, built once instead of per call
+HEADERS_RETURN = types.MappingProxyType({"Prefer": "return=representation"})
+HEADERS_MERGE = types.MappingProxyType({"Prefer": "resolution=merge-duplicates"})
+
+# Table endpoints and select lists, compiled once. Passing filters via
+# params= lets the HTTP client do the percent-encoding (no injection risk
+# from odd user_ids) and skips per-call f-string assembly.
+PROFILES_URL = f"{SUPABASE_REST_URL}/profiles"
+ROLES_URL = f"{SUPABASE_REST_URL}/user_preferred_roles"
+SKILLS_URL = f"{SUPABASE_REST_URL}/user_skills"
+TRENDS_URL = f"{SUPABASE_REST_URL}/skill_trends"
+JOBS_URL = f"{SUPABASE_REST_URL}/fetched_jobs"
+DISCUSSIONS_URL = f"{SUPABASE_REST_URL}/fetched_discussions"
+ANALYSES_URL = f"{SUPABASE_REST_URL}/skill_gap_analyses"
+REPORTS_URL = f"{SUPABASE_REST_URL}/reports"
+GITHUB_CONNECTIONS_URL = f"{SUPABASE_REST_URL}/github_connections"
+USER_API_KEYS_URL = f"{SUPABASE_REST_URL}/user_api_keys"
+ANALYSIS_NEEDED_RPC_URL = f"{SUPABASE_REST_URL}/rpc/analysis_needed"
+
+SKILLS_SELECT = "skill_name,source,proficiency_level,confidence_score,source_repo"
+TRENDS_SELECT = "skill_name,job_mention_count,discussion_mention_count,trend_direction"
+JOBS_SELECT = "title,company_name,description,work_type,experience_level"
+DISCUSSIONS_SELECT = "title,body,subreddit,upvotes,comments_count"
+
+# Pooled session for the sync write helpers - keep-alive avoids a full
+# TLS handshake per Supabase call (PostgREST supports it via the proxy).
+_session = requests.Session()
+_session.headers.update(HEADERS)
+_session.mount("https://", HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=64,
+    max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504])
+))
+
+# Shared async client - one TCP+TLS connection multiplexed over HTTP/2
+# instead of a fresh handshake per Supabase call.
+_async_client: httpx.AsyncClient = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Get (or lazily create) the shared async HTTP client."""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(headers=HEADERS, timeout=10, http2=True)
+    return _async_client
+
+
+async def close_async_client():
+    """Close the shared async client (called from app shutdown)."""
+    global _async_client
+    if _async_client is not None and not _async_client.is_closed:
+        await _async_client.aclose()
+    _async_client = None
+
+
+# Market data (trends/jobs/discussions) is identical for every user and
+# changes on the trend-service schedule, so cache it for 10 minutes.
+# _market_validators keeps the last ETag/Last-Modified plus the stale body
+# past the TTL, so expiry turns into a cheap conditional GET (304 = reuse).
+_market_cache = TTLCache(maxsize=64, ttl=600)
+_market_validators: dict = {}
+_market_cache_lock = threading.Lock()
+
 
+def clear_market_cache():
+    """Invalidate cached market data (after the trend pipeline refreshes)."""
+    with _market_cache_lock:
+        _market_cache.clear()
+        _market_validators.clear()
 
-def get_user_profile(user_id: str) -> dict:
+
+async def _fetch_market_data(name: str, url: str, params: dict) -> list[dict]:
+    """Shared TTL-cached, revalidating fetch for the market-data tables."""
+    key = hashkey(name, params.get("limit"))
+    with _market_cache_lock:
+        cached = _market_cache.get(key)
+        validator = _market_validators.get(key)
+    if cached is not None:
+        return cached
+
+    headers = {}
+    if validator:
+        etag, last_modified, _ = validator
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    response = await get_async_client().get(url, params=params, headers=headers or None)
+
+    if response.status_code == 304 and validator:
+        # Unchanged upstream - reuse the stale body for another TTL window
+        data = validator[2]
+        with _market_cache_lock:
+            _market_cache[key] = data
+        return data
+
+    if response.status_code == 200:
+        data = response.json()
+        with _market_cache_lock:
+            _market_cache[key] = data
+            _market_validators[key] = (
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                data
+            )
+        return data
+    return []
+
+
+async def get_user_profile(user_id: str) -> dict:
     """Get user profile data."""
-    url = f"{SUPABASE_REST_URL}/profiles?id=eq.{user_id}&select=*"
-    response = requests.get(url, headers=HEADERS, timeout=10)
-    
+    response = await get_async_client().get(
+        PROFILES_URL, params={"id": f"eq.{user_id}", "select": "*"}
+    )
+
     if response.status_code == 200 and response.json():
         return response.json()[0]
     return {}
 
 
-def get_user_preferred_roles(user_id: str) -> list[str]:
+async def get_user_preferred_roles(user_id: str) -> list[str]:
     """Get user's preferred job roles (up to 3)."""
-    url = f"{SUPABASE_REST_URL}/user_preferred_roles?user_id=eq.{user_id}&select=role_name&order=priority.asc"
-    response = requests.get(url, headers=HEADERS, timeout=10)
-    
+    response = await get_async_client().get(
+        ROLES_URL,
+        params={"user_id": f"eq.{user_id}", "select": "role_name", "order": "priority.asc"}
+    )
+
     if response.status_code == 200 and response.json():
         return [r["role_name"] for r in response.json()]
     return []
 
 
-def get_user_skills(user_id: str) -> list[dict]:
+async def get_user_skills(user_id: str) -> list[dict]:
     """Get user's skills from resume and GitHub."""
-    url = f"{SUPABASE_REST_URL}/user_skills?user_id=eq.{user_id}&select=skill_name,source,proficiency_level,confidence_score,source_repo"
-    response = requests.get(url, headers=HEADERS, timeout=10)
-    
+    response = await get_async_client().get(
+        SKILLS_URL, params={"user_id": f"eq.{user_id}", "select": SKILLS_SELECT}
+    )
+
     if response.status_code == 200:
         return response.json()
     return []
 
 
-def get_skill_trends(limit: int = 30) -> list[dict]:
+async def get_skill_trends(limit: int = 30) -> list[dict]:
     """Get current skill trends from the trend service data."""
-    url = f"{SUPABASE_REST_URL}/skill_trends?select=skill_name,job_mention_count,discussion_mention_count,trend_direction&order=job_mention_count.desc&limit={limit}"
-    response = requests.get(url, headers=HEADERS, timeout=10)
-    
-    if response.status_code == 200:
-        return response.json()
-    return []
+    return await _fetch_market_data(
+        "trends",
+        TRENDS_URL,
+        {"select": TRENDS_SELECT, "order": "job_mention_count.desc", "limit": limit}
+    )
 
 
-def get_recent_jobs(limit: int = 50) -> list[dict]:
+async def get_recent_jobs(limit: int = 50) -> list[dict]:
     """Get recently fetched jobs for market analysis."""
-    url = f"{SUPABASE_REST_URL}/fetched_jobs?select=title,company_name,description,work_type,experience_level&order=fetched_at.desc&limit={limit}"
-    response = requests.get(url, headers=HEADERS, timeout=10)
-    
+    return await _fetch_market_data(
+        "jobs",
+        JOBS_URL,
+        {"select": JOBS_SELECT, "order": "fetched_at.desc", "limit": limit}
+    )
+
+
+async def get_recent_discussions(limit: int = 30) -> list[dict]:
+    """Get recent Reddit discussions."""
+    return await _fetch_market_data(
+        "discussions",
+        DISCUSSIONS_URL,
+        {"select": DISCUSSIONS_SELECT, "order": "upvotes.desc", "limit": limit}
+    )
+
+
+async def get_preferred_roles_bulk(user_ids: list[str]) -> dict[str, list[str]]:
+    """Get preferred roles for many users in one query, grouped by user."""
+    if not user_ids:
+        return {}
+    response = await get_async_client().get(
+        ROLES_URL,
+        params={
+            "user_id": f"in.({','.join(user_ids)})",
+            "select": "user_id,role_name",
+            "order": "user_id,priority.asc"
+        }
+    )
+
+    roles_by_user: dict[str, list[str]] = {}
+    if response.status_code == 200:
+        for row in response.json():
+            roles_by_user.setdefault(row["user_id"], []).append(row["role_name"])
+    return roles_by_user
+
+
+async def get_skills_bulk(user_ids: list[str]) -> dict[str, list[dict]]:
+    """Get skills for many users in one query, grouped by user."""
+    if not user_ids:
+        return {}
+    response = await get_async_client().get(
+        SKILLS_URL,
+        params={"user_id": f"in.({','.join(user_ids)})", "select": f"user_id,{SKILLS_SELECT}"}
+    )
+
+    skills_by_user: dict[str, list[dict]] = {}
+    if response.status_code == 200:
+        for row in response.json():
+            uid = row.pop("user_id")
+            skills_by_user.setdefault(uid, []).append(row)
+    return skills_by_user
+
+
+async def get_analysis_decision_data_bulk(user_ids: list[str]) -> dict[str, dict]:
+    """
+    Get the three timestamps behind the cron skip decision (last analysis,
+    resume upload, GitHub sync) for many users in three bulk queries.
+    """
+    if not user_ids:
+        return {}
+    id_list = ",".join(user_ids)
+    client = get_async_client()
+
+    analyses_resp, profiles_resp, github_resp = await asyncio.gather(
+        client.get(ANALYSES_URL, params={
+            "user_id": f"in.({id_list})",
+            "select": "user_id,analyzed_at",
+            "order": "analyzed_at.desc"
+        }),
+        client.get(PROFILES_URL, params={
+            "id": f"in.({id_list})",
+            "select": "id,resume_uploaded_at"
+        }),
+        client.get(GITHUB_CONNECTIONS_URL, params={
+            "user_id": f"in.({id_list})",
+            "select": "user_id,last_sync_at"
+        })
+    )
+
+    decision_data = {uid: {} for uid in user_ids}
+    if analyses_resp.status_code == 200:
+        for row in analyses_resp.json():
+            # Rows are ordered by analyzed_at desc - keep the first per user
+            entry = decision_data.setdefault(row["user_id"], {})
+            entry.setdefault("last_analyzed_at", row["analyzed_at"])
+    if profiles_resp.status_code == 200:
+        for row in profiles_resp.json():
+            decision_data.setdefault(row["id"], {})["resume_uploaded_at"] = row.get("resume_uploaded_at")
+    if github_resp.status_code == 200:
+        for row in github_resp.json():
+            decision_data.setdefault(row["user_id"], {})["last_sync_at"] = row.get("last_sync_at")
+    return decision_data
+
+
+def analysis_needed_from_timestamps(decision_data: dict) -> bool:
+    """In-memory version of the cron skip decision from pre-fetched timestamps."""
+    last_analysis = decision_data.get("last_analyzed_at")
+    if not last_analysis:
+        return True  # Never analyzed
+
+    try:
+        last_analysis_dt = ciso8601.parse_datetime(last_analysis)
+
+        resume_uploaded = decision_data.get("resume_uploaded_at")
+        if resume_uploaded:
+            resume_dt = ciso8601.parse_datetime(resume_uploaded)
+            if resume_dt > last_analysis_dt:
+                return True
+
+        last_sync = decision_data.get("last_sync_at")
+        if last_sync:
+            sync_dt = ciso8601.parse_datetime(last_sync)
+            if sync_dt > last_analysis_dt:
+                return True
+
+        return False
+    except Exception as e:
+        logger.warning("Error evaluating analysis need: %s", e)
+        return True  # Fail safe: run it
+
+
+async def fetch_latest_analysis(user_id: str) -> dict:
+    """Get the user's most recent skill gap analysis row."""
+    response = await get_async_client().get(
+        ANALYSES_URL,
+        params={
+            "user_id": f"eq.{user_id}",
+            "select": "*",
+            "order": "analyzed_at.desc",
+            "limit": 1
+        }
+    )
+
+    if response.status_code == 200 and response.json():
+        return response.json()[0]
+    return {}
+
+
+async def fetch_analysis_history(user_id: str, limit: int = 10) -> list[dict]:
+    """Get the user's analysis history (newest first)."""
+    response = await get_async_client().get(
+        ANALYSES_URL,
+        params={
+            "user_id": f"eq.{user_id}",
+            "select": "id,target_job_title,gap_percentage,role_fit_score,analyzed_at",
+            "order": "analyzed_at.desc",
+            "limit": limit
+        }
+    )
+
     if response.status_code == 200:
         return response.json()
     return []
 
 
-def get_recent_discussions(limit: int = 30) -> list[dict]:
-    """Get recent Reddit discussions."""
-    url = f"{SUPABASE_REST_URL}/fetched_discussions?select=title,body,subreddit,upvotes,comments_count&order=upvotes.desc&limit={limit}"
-    response = requests.get(url, headers=HEADERS, timeout=10)
-    
+async def fetch_user_reports(user_id: str, limit: int = 10) -> list[dict]:
+    """Get the user's generated report records (newest first)."""
+    response = await get_async_client().get(
+        REPORTS_URL,
+        params={
+            "user_id": f"eq.{user_id}",
+            "select": "id,report_filename,report_url,generated_at,email_sent,email_sent_at",
+            "order": "generated_at.desc",
+            "limit": limit
+        }
+    )
+
     if response.status_code == 200:
         return response.json()
     return []
@@ -76,36 +356,47 @@ def get_recent_discussions(limit: int = 30) -> list[dict]:
 def store_analysis_result(
     user_id: str,
     preferred_roles: list[str],
-    analysis: dict
+    analysis: dict,
+    analysis_id: str = None
 ) -> str:
-    """Store the analysis result in skill_gap_analyses table."""
-    
-    # Prepare data for insertion
+    """
+    Store the analysis result in skill_gap_analyses table.
+    Pass analysis_id to insert under a client-generated UUID (used when the
+    write happens in a background task after the response was sent).
+    """
+
+    # Bind the nested pieces once instead of re-traversing the analysis
+    # dict (and allocating throwaway defaults) per field
+    assessment = analysis.get("skill_assessment") or {}
+    missing = analysis.get("critical_missing_skills") or []
+    comp_scores = analysis.get("competitiveness_scores") or []
+
     analysis_data = {
         "user_id": user_id,
         "target_job_title": ", ".join(preferred_roles),
         "model_version": analysis.get("model_used", "gemini-2.5-pro"),
         "gap_percentage": analysis.get("overall_gap_percentage", 0),
         "role_fit_score": analysis.get("overall_fit_score", 0),
-        "matched_skills": analysis.get("skill_assessment", {}).get("strong_skills", []),
-        "missing_skills": [s.get("skill") for s in analysis.get("critical_missing_skills", [])],
-        "partial_skills": analysis.get("skill_assessment", {}).get("needs_improvement", []),
-        "recommendations": analysis.get("recommendations", {}),
-        "market_demand_score": analysis.get("competitiveness_scores", [{}])[0].get("score", 0) if analysis.get("competitiveness_scores") else 0,
+        "matched_skills": assessment.get("strong_skills") or [],
+        "missing_skills": [s["skill"] for s in missing if "skill" in s],
+        "partial_skills": assessment.get("needs_improvement") or [],
+        "recommendations": analysis.get("recommendations") or {},
+        "market_demand_score": comp_scores[0].get("score", 0) if comp_scores else 0,
         "trend_direction": "stable",
         "status": "completed",
-        "analyzed_at": datetime.now(timezone.utc).isoformat()
+        "analyzed_at": datetime.now(timezone.utc)
     }
+    if analysis_id:
+        analysis_data["id"] = analysis_id
     
-    url = f"{SUPABASE_REST_URL}/skill_gap_analyses"
-    headers = {**HEADERS, "Prefer": "return=representation"}
-    
-    response = requests.post(url, headers=headers, json=analysis_data, timeout=10)
+    # Pre-serialize with orjson (handles datetime natively) - skips the
+    # stdlib encoder inside requests
+    response = _session.post(ANALYSES_URL, headers=HEADERS_RETURN, data=orjson.dumps(analysis_data, option=orjson.OPT_UTC_Z), timeout=10)
     
     if response.status_code in [200, 201] and response.json():
         return response.json()[0].get("id", "")
     
-    print(f"Error storing analysis: {response.text}")
+    logger.error("Error storing analysis: status=%s body=%s", response.status_code, response.text)
     return ""
 
 
@@ -114,10 +405,12 @@ def store_report_record(
     analysis_id: str,
     report_filename: str,
     report_url: str,
-    report_size: int
+    report_size: int,
+    report_id: str = None
 ) -> str:
-    """Store the report record in reports table."""
-    
+    """Store the report record in reports table. Accepts an optional
+    client-generated report_id (same contract as store_analysis_result)."""
+
     report_data = {
         "user_id": user_id,
         "analysis_id": analysis_id,
@@ -126,26 +419,31 @@ def store_report_record(
         "report_size_bytes": report_size,
         "report_type": "skill_gap_analysis",
         "status": "generated",
-        "generated_at": datetime.now(timezone.utc).isoformat()
+        "generated_at": datetime.now(timezone.utc)
     }
+    if report_id:
+        report_data["id"] = report_id
     
-    url = f"{SUPABASE_REST_URL}/reports"
-    headers = {**HEADERS, "Prefer": "return=representation"}
-    
-    response = requests.post(url, headers=headers, json=report_data, timeout=10)
+    response = _session.post(REPORTS_URL, headers=HEADERS_RETURN, data=orjson.dumps(report_data, option=orjson.OPT_UTC_Z), timeout=10)
     
     if response.status_code in [200, 201] and response.json():
         return response.json()[0].get("id", "")
     
-    print(f"Error storing report record: {response.text}")
+    logger.error("Error storing report record: status=%s body=%s", response.status_code, response.text)
     return ""
 
 
 def get_all_users_for_cron() -> list[dict]:
     """Get all users who should receive weekly reports."""
     # Get users with notification_interval = 'weekly' and have connected GitHub or uploaded resume
-    url = f"{SUPABASE_REST_URL}/profiles?select=id,email,full_name&or=(github_username.neq.null,resume_url.neq.null)"
-    response = requests.get(url, headers=HEADERS, timeout=10)
+    response = _session.get(
+        PROFILES_URL,
+        params={
+            "select": "id,email,full_name",
+            "or": "(github_username.neq.null,resume_url.neq.null)"
+        },
+        timeout=10
+    )
     
     if response.status_code == 200:
         return response.json()
@@ -155,23 +453,34 @@ def get_all_users_for_cron() -> list[dict]:
 def set_preferred_roles(user_id: str, roles: list[str]) -> dict:
     """Set or update user's preferred roles (max 3)."""
     # First delete existing roles
-    delete_url = f"{SUPABASE_REST_URL}/user_preferred_roles?user_id=eq.{user_id}"
-    requests.delete(delete_url, headers=HEADERS, timeout=10)
-    
-    # Insert new roles
-    inserted = []
-    for i, role in enumerate(roles[:3], 1):
-        role_data = {
+    _session.delete(ROLES_URL, params={"user_id": f"eq.{user_id}"}, timeout=10)
+
+    # Insert all new roles in one bulk POST (PostgREST accepts a JSON array)
+    payload = [
+        {
             "user_id": user_id,
             "role_name": role,
             "role_name_normalized": role.lower().strip(),
             "priority": i
         }
-        url = f"{SUPABASE_REST_URL}/user_preferred_roles"
-        response = requests.post(url, headers=HEADERS, json=role_data, timeout=10)
-        if response.status_code in [200, 201]:
-            inserted.append(role)
-    
+        for i, role in enumerate(roles[:3], 1)
+    ]
+
+    if not payload:
+        return {"inserted": [], "count": 0}
+
+    response = _session.post(
+        ROLES_URL,
+        headers=HEADERS_MERGE,
+        data=orjson.dumps(payload),
+        timeout=10
+    )
+
+    if response.status_code in [200, 201]:
+        inserted = [r["role_name"] for r in payload]
+    else:
+        inserted = []
+
     return {"inserted": inserted, "count": len(inserted)}
 
 
@@ -179,14 +488,17 @@ def save_user_api_key(user_id: str, api_key: str) -> dict:
     """Save user's Gemini API key."""
     # For simplicity, we'll store a hash and prefix
     # In production, encrypt the key properly
-    import hashlib
-    
-    key_hash = hashlib.sha256(api_key.encode()).hexdigest()
+    # blake2b: the hash is only an identity check, not a security boundary,
+    # and it's 2-3x faster than SHA-256 here
+    key_hash = hashlib.blake2b(api_key.encode(), digest_size=32).hexdigest()
     key_prefix = api_key[:8] + "..." if len(api_key) > 8 else api_key
     
     # Check if exists
-    check_url = f"{SUPABASE_REST_URL}/user_api_keys?user_id=eq.{user_id}&provider=eq.google_ai_studio"
-    check_resp = requests.get(check_url, headers=HEADERS, timeout=10)
+    check_resp = _session.get(
+        USER_API_KEYS_URL,
+        params={"user_id": f"eq.{user_id}", "provider": "eq.google_ai_studio"},
+        timeout=10
+    )
     
     key_data = {
         "user_id": user_id,
@@ -200,14 +512,19 @@ def save_user_api_key(user_id: str, api_key: str) -> dict:
     if check_resp.status_code == 200 and check_resp.json():
         # Update existing
         key_id = check_resp.json()[0]["id"]
-        update_url = f"{SUPABASE_REST_URL}/user_api_keys?id=eq.{key_id}"
-        requests.patch(update_url, headers=HEADERS, json=key_data, timeout=10)
-        return {"status": "updated", "prefix": key_prefix}
+        _session.patch(USER_API_KEYS_URL, params={"id": f"eq.{key_id}"}, json=key_data, timeout=10)
+        result = {"status": "updated", "prefix": key_prefix}
     else:
         # Insert new
-        url = f"{SUPABASE_REST_URL}/user_api_keys"
-        requests.post(url, headers=HEADERS, json=key_data, timeout=10)
-        return {"status": "created", "prefix": key_prefix}
+        _session.post(USER_API_KEYS_URL, json=key_data, timeout=10)
+        result = {"status": "created", "prefix": key_prefix}
+
+    # Drop the cached copy so the new key takes effect immediately.
+    # Imported lazily to keep the module dependency one-way at import time.
+    from app.services.key_service import invalidate_user_key
+    invalidate_user_key(user_id)
+
+    return result
 
 
 def check_if_analysis_needed(user_id: str) -> bool:
@@ -217,11 +534,34 @@ def check_if_analysis_needed(user_id: str) -> bool:
     1. No previous analysis
     2. Resume uploaded AFTER last analysis
     3. GitHub synced AFTER last analysis
+
+    Uses the analysis_needed(uid uuid) Postgres function (one round trip)
+    when it's deployed; otherwise falls back to the 3-query check below.
     """
+    try:
+        resp = _session.post(ANALYSIS_NEEDED_RPC_URL, json={"uid": user_id}, timeout=5)
+        if resp.status_code == 200:
+            return bool(resp.json())
+    except Exception as e:
+        logger.warning("analysis_needed RPC failed for %s: %s", user_id, e)
+
+    return _check_if_analysis_needed_fallback(user_id)
+
+
+def _check_if_analysis_needed_fallback(user_id: str) -> bool:
+    """Legacy 3-query skip check, used when the RPC isn't available."""
     try:
         # 1. Get last analysis time
-        url = f"{SUPABASE_REST_URL}/skill_gap_analyses?user_id=eq.{user_id}&select=analyzed_at&order=analyzed_at.desc&limit=1"
-        resp = requests.get(url, headers=HEADERS, timeout=5)
+        resp = _session.get(
+            ANALYSES_URL,
+            params={
+                "user_id": f"eq.{user_id}",
+                "select": "analyzed_at",
+                "order": "analyzed_at.desc",
+                "limit": 1
+            },
+            timeout=5
+        )
         last_analysis = None
         if resp.status_code == 200 and resp.json():
             last_analysis = resp.json()[0]['analyzed_at']
@@ -232,33 +572,39 @@ def check_if_analysis_needed(user_id: str) -> bool:
         # Convert to datetime (if string)
         # Handle formats efficiently
         if isinstance(last_analysis, str):
-            last_analysis_dt = datetime.fromisoformat(last_analysis.replace('Z', '+00:00'))
+            last_analysis_dt = ciso8601.parse_datetime(last_analysis)
         else:
             return True
 
         # 2. Get Profile (Resume upload)
-        profile_url = f"{SUPABASE_REST_URL}/profiles?id=eq.{user_id}&select=resume_uploaded_at"
-        p_resp = requests.get(profile_url, headers=HEADERS, timeout=5)
+        p_resp = _session.get(
+            PROFILES_URL,
+            params={"id": f"eq.{user_id}", "select": "resume_uploaded_at"},
+            timeout=5
+        )
         if p_resp.status_code == 200 and p_resp.json():
             resume_uploaded = p_resp.json()[0].get('resume_uploaded_at')
             if resume_uploaded:
-                resume_dt = datetime.fromisoformat(resume_uploaded.replace('Z', '+00:00'))
+                resume_dt = ciso8601.parse_datetime(resume_uploaded)
                 if resume_dt > last_analysis_dt:
-                    print(f"User {user_id}: New resume detected ({resume_dt}) > Last Analysis ({last_analysis_dt})")
+                    logger.info("User %s: New resume detected (%s) > Last Analysis (%s)", user_id, resume_dt, last_analysis_dt)
                     return True
 
         # 3. Get GitHub Connection (Last Sync)
-        gh_url = f"{SUPABASE_REST_URL}/github_connections?user_id=eq.{user_id}&select=last_sync_at"
-        gh_resp = requests.get(gh_url, headers=HEADERS, timeout=5)
+        gh_resp = _session.get(
+            GITHUB_CONNECTIONS_URL,
+            params={"user_id": f"eq.{user_id}", "select": "last_sync_at"},
+            timeout=5
+        )
         if gh_resp.status_code == 200 and gh_resp.json():
             last_sync = gh_resp.json()[0].get('last_sync_at')
             if last_sync:
-                sync_dt = datetime.fromisoformat(last_sync.replace('Z', '+00:00'))
+                sync_dt = ciso8601.parse_datetime(last_sync)
                 if sync_dt > last_analysis_dt:
-                    print(f"User {user_id}: New GitHub sync detected ({sync_dt}) > Last Analysis ({last_analysis_dt})")
+                    logger.info("User %s: New GitHub sync detected (%s) > Last Analysis (%s)", user_id, sync_dt, last_analysis_dt)
                     return True
         
         return False
     except Exception as e:
-        print(f"Error checking analysis need for {user_id}: {e}")
+        logger.warning("Error checking analysis need for %s: %s", user_id, e)
         return True # Fail safe: run it
@@ -4,112 +4,50 @@ Implements BYOK (Bring Your Own Key) policy
 """
 import google.generativeai as genai
 from app.core.config import settings
-import requests
-import json
-from typing import Optional
-
-SUPABASE_REST_URL = f"{settings.SUPABASE_URL}/rest/v1"
-HEADERS = {
-    "apikey": settings.SUPABASE_KEY,
-    "Authorization": f"Bearer {settings.SUPABASE_KEY}",
-    "Content-Type": "application/json"
-}
-
+from app.services.analysis_schema import SkillAnalysisResponse
+from app.services.key_service import get_user_gemini_key
+import asyncio
+import logging
+import orjson
+import threading
+from functools import lru_cache
+from cachetools import TTLCache
+import os
+import re
+from datetime import datetime, timezone
+from pydantic_core import from_json
+from typing import Final, Optional
 
-def get_user_gemini_key(user_id: str) -> Optional[str]:
-    """
-    Get user's own Gemini API key from database.
-    Returns None if user hasn't set their key.
-    """
-    try:
-        url = f"{SUPABASE_REST_URL}/user_api_keys?user_id=eq.{user_id}&provider=eq.google_ai_studio&is_active=eq.true&select=api_key_encrypted"
-        response = requests.get(url, headers=HEADERS, timeout=10)
-        
-        if response.status_code == 200 and response.json():
-            encrypted_key = response.json()[0].get("api_key_encrypted")
-            # In production, decrypt the key here
-            # For now, we'll store keys in plain text temporarily
-            return encrypted_key
-        return None
-    except Exception as e:
-        print(f"Error fetching user API key: {e}")
-        return None
+logger = logging.getLogger(__name__)
 
 
-def get_api_key_for_user(user_id: str) -> tuple[str, str]:
-    """
-    Get API key for user following BYOK policy.
-    Returns (api_key, source) where source is 'user' or 'system'
-    """
-    from app.services.key_service import get_gemini_key
-    
-    # First try user's own key
-    user_key = get_user_gemini_key(user_id)
-    if user_key:
-        return user_key, "user"
-    
-    # Try dynamic system key from database
-    db_key = get_gemini_key()
-    if db_key:
-        return db_key, "system"
-    
-    # Fallback to environment variable
-    if settings.GEMINI_API_KEY:
-        return settings.GEMINI_API_KEY, "system"
-    
-    raise ValueError("No API key available. Please add your Gemini API key in settings.")
-
-
-def analyze_skill_gap(
-    user_id: str,
-    user_name: str,
-    user_email: str,
-    preferred_roles: list[str],
-    user_skills: list[dict],
-    market_trends: list[dict],
-    trending_skills: list[dict],
-    recent_discussions: list[dict]
-) -> dict:
-    """
-    Use Gemini 2.5 Pro to perform deep skill gap analysis.
-    Returns comprehensive analysis with recommendations.
-    """
-    
-    # Get API key (BYOK policy)
-    api_key, key_source = get_api_key_for_user(user_id)
-    
-    # Configure Gemini
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(settings.GEMINI_MODEL)
-    
-    # Prepare the analysis prompt
-    prompt = f"""You are Gemini 2.5 Pro (Deep Thinking Model), an expert career advisor and technical skills analyst. 
+# The prompt is mostly static text, so it lives here as an immutable
+# template and only the per-request fragments are formatted in. The JSON
+# schema block stays in its own unformatted constant so its braces don't
+# need doubling.
+_PROMPT_TEMPLATE: Final[str] = """You are Gemini 2.5 Pro (Deep Thinking Model), an expert career advisor and technical skills analyst. 
     Using your advanced deep thinking capabilities, analyze the following data and provide a comprehensive skill gap analysis report.
 
 ## User Profile
 - Name: {user_name}
 - Email: {user_email}
-- Target Roles: {', '.join(preferred_roles)}
+- Target Roles: {target_roles}
 
 ## User's Current Skills (from Resume & GitHub Projects)
     NOTE: 'proficiency_level' indicates the number of unique projects/resumes where this skill was utilized. 
     High proficiency (e.g., >2) indicates repetitive usage and stronger expertise. 
     Treat high proficiency counts as evidence of deep experience and validated skills.
-{json.dumps(user_skills, indent=2)}
+{skills_json}
 
 ## Current Market Trends (from Job Listings)
 Top skills demanded in job postings:
-{json.dumps(market_trends[:20], indent=2)}
+{trends_json}
 
 ## Trending Skills in Tech Community (from Reddit Discussions)
-{json.dumps(trending_skills[:15], indent=2)}
+{trending_json}
 
 ## Recent Industry Discussions
-{json.dumps([{{
-    'title': d.get('title', ''),
-    'subreddit': d.get('subreddit', ''),
-    'upvotes': d.get('upvotes', 0)
-}} for d in recent_discussions[:10]], indent=2)}
+{discussions_json}
 
 ---
 
@@ -134,11 +72,10 @@ Analyze the user's current skills:
 - Rate their overall market readiness (1-10 scale)
 
 ### 4. SKILL GAP ANALYSIS FOR TARGET ROLES
-For each of the user's target roles ({', '.join(preferred_roles)}):
+For each of the user's target roles ({target_roles}):
 - List the top 10 required skills for that role
 - Identify which skills the user already has (✅)
 - Identify which skills are missing (❌)
-- Calculate gap percentage for each role
 
 ### 5. CRITICAL MISSING SKILLS
 List the most important skills the user lacks, prioritized by:
@@ -167,110 +104,380 @@ Provide 3-5 unique insights that might not be obvious, based on the data analysi
 
 ---
 
-Format the response as a structured JSON object with the following keys:
-{{
+"""
+
+_SCHEMA_INSTRUCTIONS: Final[str] = """Format the response as a structured JSON object with the following keys:
+{
     "executive_summary": "string",
-    "market_trends": {{
+    "market_trends": {
         "top_skills": ["list of top 5 skills"],
         "growing_technologies": ["list"],
         "market_direction": "string",
         "key_statistics": ["list of stats"]
-    }},
-    "skill_assessment": {{
+    },
+    "skill_assessment": {
         "strong_skills": ["list"],
         "needs_improvement": ["list"],
         "market_readiness_score": number (1-10),
         "assessment_notes": "string"
-    }},
+    },
     "gap_analysis": [
-        {{
+        {
             "role": "role name",
             "required_skills": ["list of 10 skills"],
             "user_has": ["skills user has"],
-            "user_missing": ["skills user is missing"],
-            "gap_percentage": number
-        }}
+            "user_missing": ["skills user is missing"]
+        }
     ],
     "critical_missing_skills": [
-        {{
+        {
             "skill": "name",
             "importance": "high/medium/low",
             "learning_difficulty": "easy/medium/hard",
             "reason": "why important"
-        }}
+        }
     ],
-    "recommendations": {{
+    "recommendations": {
         "immediate_actions": ["list of 3-5 actions"],
         "short_term_goals": ["list of goals"],
         "long_term_strategy": "string"
-    }},
+    },
     "learning_resources": [
-        {{
+        {
             "skill": "skill name",
             "free_resources": ["list"],
             "paid_courses": ["list"],
             "certifications": ["list"],
             "project_ideas": ["list"]
-        }}
+        }
     ],
     "competitiveness_scores": [
-        {{
+        {
             "role": "role name",
             "score": number (1-100),
             "explanation": "string"
-        }}
+        }
     ],
-    "key_insights": ["list of 3-5 insights"],
-    "overall_gap_percentage": number,
-    "overall_fit_score": number (1-100),
-    "report_generated_at": "current timestamp"
-}}
+    "key_insights": ["list of 3-5 insights"]
+}
 
 Be thorough, specific, and actionable. The user will use this to guide their career development.
 """
-    
+
+
+# The market fetchers hand every caller the same cached list object, so
+# the serialized prompt fragments can be memoized by identity - one
+# orjson pass per cache refresh instead of one per analysis. Entries pin
+# the source list so its id can't be recycled while cached, and the
+# identity check below makes a stale hit impossible.
+_fragment_cache = TTLCache(maxsize=16, ttl=600)
+
+
+def _serialize_fragment(items: list, limit: int) -> str:
+    key = (id(items), limit)
+    hit = _fragment_cache.get(key)
+    if hit is not None and hit[0] is items:
+        return hit[1]
+    rendered = orjson.dumps(items[:limit]).decode()
+    _fragment_cache[key] = (items, rendered)
+    return rendered
+
+
+def _compute_derived_fields(analysis: dict) -> None:
+    """
+    Fill in the numeric fields derived from the gap analysis locally.
+    Set arithmetic over the skill lists is cheaper and more reliable than
+    having the model emit the numbers, and keeps ~100 tokens out of the
+    response.
+    """
+    percentages = []
+    for role in analysis.get("gap_analysis") or []:
+        if not isinstance(role, dict):
+            continue
+        required = len(role.get("required_skills") or [])
+        missing = len(role.get("user_missing") or [])
+        pct = round(100 * missing / required, 1) if required else 0.0
+        role["gap_percentage"] = pct
+        percentages.append(pct)
+
+    overall_gap = round(sum(percentages) / len(percentages), 1) if percentages else 0.0
+    analysis["overall_gap_percentage"] = overall_gap
+    analysis["overall_fit_score"] = max(0, min(100, round(100 - overall_gap)))
+    analysis["report_generated_at"] = datetime.now(timezone.utc).isoformat()
+
+
+def _parse_llm_json(text: str) -> Optional[dict]:
+    """
+    Leniently parse model output into a dict.
+    Tries strict orjson first, then extracts the outermost braced block and
+    parses it with pydantic's partial parser so a response truncated at
+    max_output_tokens still yields usable fields.
+    """
     try:
-        # Generate analysis using Gemini
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.7,
-                max_output_tokens=8000,
-                response_mime_type="application/json"
-            )
+        parsed = orjson.loads(text)
+        return parsed if isinstance(parsed, dict) else None
+    except orjson.JSONDecodeError:
+        pass
+
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if match:
+        try:
+            parsed = from_json(match.group(0), allow_partial=True)
+            if isinstance(parsed, dict):
+                return parsed
+        except ValueError:
+            pass
+    return None
+
+
+def get_api_key_for_user(user_id: str) -> tuple[str, str]:
+    """
+    Get API key for user following BYOK policy.
+    Returns (api_key, source) where source is 'user' or 'system'
+    """
+    from app.services.key_service import get_gemini_key
+    
+    # First try user's own key
+    user_key = get_user_gemini_key(user_id)
+    if user_key:
+        return user_key, "user"
+    
+    # Try dynamic system key from database
+    db_key = get_gemini_key()
+    if db_key:
+        return db_key, "system"
+    
+    # Fallback to environment variable
+    if settings.GEMINI_API_KEY:
+        return settings.GEMINI_API_KEY, "system"
+    
+    raise ValueError("No API key available. Please add your Gemini API key in settings.")
+
+
+# Analyses that arrive within this window are merged into one Gemini call.
+# Jobs are grouped per API key first - BYOK users may bring their own keys
+# and those must never share a request with another user's key.
+BATCH_WINDOW_SECONDS = 0.05
+BATCH_MAX_USERS = int(os.getenv("GEMINI_BATCH_MAX_USERS", "4"))
+
+_BATCH_HEADER: Final[str] = """You will receive skill gap analysis tasks for {count} independent users, each under a '# Task N' heading.
+Analyze every task separately and return a single JSON array with exactly {count} elements, where element N-1 is the complete JSON object requested by Task N.
+Return only the array.
+
+"""
+
+# genai.configure mutates process-global state in this SDK, so the key
+# is only reapplied when it actually changes - nearly every call uses the
+# system key, making reconfiguration the rare case - and model instances
+# (tokenizer and safety-filter setup) are reused per (key, model) pair.
+_model_lock = threading.Lock()
+_configured_key: Optional[str] = None
+
+
+@lru_cache(maxsize=32)
+def _model_for(api_key: str, model_name: str) -> genai.GenerativeModel:
+    return genai.GenerativeModel(model_name)
+
+
+def _get_model(api_key: str) -> genai.GenerativeModel:
+    global _configured_key
+    with _model_lock:
+        if api_key != _configured_key:
+            genai.configure(api_key=api_key)
+            _configured_key = api_key
+        return _model_for(api_key, settings.GEMINI_MODEL)
+
+
+_batch_queue: Optional[asyncio.Queue] = None
+_batcher_task: Optional[asyncio.Task] = None
+
+
+class _AnalysisJob:
+    """One pending analysis: its rendered prompt, key and result future."""
+
+    __slots__ = ("prompt", "api_key", "key_source", "future")
+
+    def __init__(self, prompt: str, api_key: str, key_source: str):
+        self.prompt = prompt
+        self.api_key = api_key
+        self.key_source = key_source
+        self.future = asyncio.get_running_loop().create_future()
+
+
+def _ensure_batcher() -> asyncio.Queue:
+    """Lazily start the batching coroutine on the running loop."""
+    global _batch_queue, _batcher_task
+    if _batch_queue is None:
+        _batch_queue = asyncio.Queue()
+    if _batcher_task is None or _batcher_task.done():
+        _batcher_task = asyncio.create_task(_batcher())
+    return _batch_queue
+
+
+async def _batcher():
+    """Collect jobs for a short window, then dispatch them grouped by key."""
+    while True:
+        jobs = [await _batch_queue.get()]
+        await asyncio.sleep(BATCH_WINDOW_SECONDS)
+        while not _batch_queue.empty():
+            jobs.append(_batch_queue.get_nowait())
+
+        by_key: dict[str, list[_AnalysisJob]] = {}
+        for job in jobs:
+            by_key.setdefault(job.api_key, []).append(job)
+
+        for group in by_key.values():
+            while group:
+                batch, group = group[:BATCH_MAX_USERS], group[BATCH_MAX_USERS:]
+                if len(batch) == 1:
+                    asyncio.create_task(_run_single(batch[0]))
+                else:
+                    asyncio.create_task(_run_batch(batch))
+
+
+async def _generate_payload(prompt: str, api_key: str, schema=SkillAnalysisResponse):
+    """
+    Run one streamed Gemini call and return the parsed JSON payload.
+    Streaming keeps the event loop free during the 10-60s call, and parse
+    attempts are gated on a plausible document end so accumulation stays
+    O(n) over the response. The response_schema constrains the decoder to
+    valid JSON of the right shape, so the lenient-parse fallbacks should
+    only fire on truncation.
+    """
+    model = _get_model(api_key)
+
+    response = await model.generate_content_async(
+        prompt,
+        stream=True,
+        generation_config=genai.types.GenerationConfig(
+            temperature=0.7,
+            max_output_tokens=8000,
+            response_mime_type="application/json",
+            response_schema=schema
         )
-        
-        # Parse the response
-        analysis_text = response.text
-        
-        # Try to parse as JSON
+    )
+
+    chunks = []
+    payload = None
+    async for chunk in response:
+        chunks.append(chunk.text)
+        tail = chunk.text.rstrip()
+        if not tail or tail[-1] not in "}]":
+            continue
         try:
-            analysis = json.loads(analysis_text)
-        except json.JSONDecodeError:
-            # If not valid JSON, wrap in a structure
-            analysis = {
-                "raw_analysis": analysis_text,
-                "parse_error": True
-            }
-        
-        analysis["api_key_source"] = key_source
-        analysis["model_used"] = settings.GEMINI_MODEL
-        
-        return analysis
-        
+            payload = orjson.loads("".join(chunks))
+        except orjson.JSONDecodeError:
+            continue
+
+    if payload is None:
+        text = "".join(chunks)
+        payload = _parse_llm_json(text)
+        if payload is None:
+            # Nothing recoverable - wrap the raw text in a structure
+            payload = {"raw_analysis": text, "parse_error": True}
+    return payload
+
+
+def _finish(job: _AnalysisJob, analysis) -> None:
+    """Post-process one user's payload and resolve the waiting future."""
+    if not isinstance(analysis, dict):
+        analysis = {"raw_analysis": str(analysis), "parse_error": True}
+
+    if not analysis.get("parse_error"):
+        _compute_derived_fields(analysis)
+
+    analysis["api_key_source"] = job.key_source
+    analysis["model_used"] = settings.GEMINI_MODEL
+
+    if not job.future.done():
+        job.future.set_result(analysis)
+
+
+async def _run_single(job: _AnalysisJob) -> None:
+    """Run one job on its own Gemini call, with the quota fallback."""
+    try:
+        try:
+            payload = await _generate_payload(job.prompt, job.api_key)
+        except Exception as e:
+            # If the user's own key hit its quota, retry on the system key
+            error_msg = str(e).lower()
+            quota_hit = "quota" in error_msg or "limit" in error_msg
+            if not (quota_hit and job.key_source == "user" and settings.GEMINI_API_KEY):
+                raise
+            logger.warning("User key quota exceeded, falling back to system key")
+            job.api_key, job.key_source = settings.GEMINI_API_KEY, "system"
+            payload = await _generate_payload(job.prompt, job.api_key)
+        _finish(job, payload)
     except Exception as e:
-        error_msg = str(e)
-        
-        # Check if it's a quota error
-        if "quota" in error_msg.lower() or "limit" in error_msg.lower():
-            # If user's key hit limit, try system key
-            if key_source == "user" and settings.GEMINI_API_KEY:
-                print(f"User key quota exceeded, falling back to system key")
-                genai.configure(api_key=settings.GEMINI_API_KEY)
-                # Recursively try with system key
-                return analyze_skill_gap(
-                    user_id, user_name, user_email, preferred_roles,
-                    user_skills, market_trends, trending_skills, recent_discussions
-                )
-        
-        raise Exception(f"Gemini analysis failed: {error_msg}")
+        if not job.future.done():
+            job.future.set_exception(Exception(f"Gemini analysis failed: {e}"))
+
+
+async def _run_batch(jobs: list[_AnalysisJob]) -> None:
+    """Run several same-key jobs as one Gemini call and split the reply."""
+    prompt = _BATCH_HEADER.format(count=len(jobs)) + "\n\n".join(
+        f"# Task {i + 1}\n\n{job.prompt}" for i, job in enumerate(jobs)
+    )
+
+    try:
+        payload = await _generate_payload(prompt, jobs[0].api_key, schema=list[SkillAnalysisResponse])
+    except Exception as e:
+        logger.warning("Batched Gemini call failed (%s); retrying %d jobs solo", e, len(jobs))
+        payload = None
+
+    if isinstance(payload, list) and len(payload) == len(jobs):
+        for job, item in zip(jobs, payload):
+            _finish(job, item)
+        return
+
+    # The reply didn't split cleanly - fall back to one call per user
+    if payload is not None:
+        logger.warning("Batched Gemini reply unusable; retrying %d jobs solo", len(jobs))
+    for job in jobs:
+        asyncio.create_task(_run_single(job))
+
+
+async def analyze_skill_gap(
+    user_id: str,
+    user_name: str,
+    user_email: str,
+    preferred_roles: list[str],
+    user_skills: list[dict],
+    market_trends: list[dict],
+    trending_skills: list[dict],
+    recent_discussions: list[dict]
+) -> dict:
+    """
+    Use Gemini 2.5 Pro to perform deep skill gap analysis.
+    Returns comprehensive analysis with recommendations.
+    Calls arriving within the batching window share one Gemini request per
+    API key; a lone call goes out immediately after the window.
+    """
+
+    # Get API key (BYOK policy) - the lookup can cost a Supabase round
+    # trip on a cache miss, so it runs on a thread while the prompt builds
+    key_task = asyncio.create_task(asyncio.to_thread(get_api_key_for_user, user_id))
+
+    # Serialize the per-request fragments compactly - Gemini doesn't need
+    # pretty-printing and the indented encoder is the slow path
+    discussions_json = orjson.dumps([{
+        'title': d.get('title', ''),
+        'subreddit': d.get('subreddit', ''),
+        'upvotes': d.get('upvotes', 0)
+    } for d in recent_discussions[:10]]).decode()
+
+    prompt = _PROMPT_TEMPLATE.format(
+        user_name=user_name,
+        user_email=user_email,
+        target_roles=', '.join(preferred_roles),
+        skills_json=orjson.dumps(user_skills).decode(),
+        trends_json=_serialize_fragment(market_trends, 20),
+        trending_json=_serialize_fragment(trending_skills, 15),
+        discussions_json=discussions_json
+    ) + _SCHEMA_INSTRUCTIONS
+
+    api_key, key_source = await key_task
+
+    job = _AnalysisJob(prompt, api_key, key_source)
+    _ensure_batcher().put_nowait(job)
+    return await job.future
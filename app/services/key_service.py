@@ -6,53 +6,123 @@ Only manages rate-limited API keys:
 
 Permanent credentials like AWS are read from environment variables only.
 """
-import requests
-from datetime import datetime, timedelta
+import atexit
+import httpx
+import logging
+from threading import Lock
+from cachetools import TTLCache
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 SUPABASE_URL = settings.SUPABASE_URL
 SUPABASE_KEY = settings.SUPABASE_SERVICE_ROLE_KEY or settings.SUPABASE_KEY
+HEADERS = {
+    "apikey": SUPABASE_KEY,
+    "Authorization": f"Bearer {SUPABASE_KEY}",
+    "Content-Type": "application/json"
+}
+
+# One keep-alive client for every sync Supabase lookup in this module and
+# gemini_service - reusing the TLS connection saves a handshake per call
+_http = httpx.Client(
+    http2=True,
+    timeout=10.0,
+    headers=HEADERS,
+    limits=httpx.Limits(max_keepalive_connections=20)
+)
+atexit.register(_http.close)
+
 
-# Cache for API keys
-_key_cache: dict = {}
-_cache_timestamp: datetime = None
-CACHE_DURATION = timedelta(minutes=5)
+def get_sync_client() -> httpx.Client:
+    """Shared pooled client for synchronous Supabase reads."""
+    return _http
+
+# Cache for API keys - TTL eviction plus a single-flight lock so a burst
+# of concurrent requests triggers exactly one Supabase round trip
+_cache = TTLCache(maxsize=64, ttl=300)
+_lock = Lock()
+_last_good: dict = {}
 
 
 def _fetch_all_keys() -> dict:
-    """Fetch all API keys from Supabase."""
-    global _key_cache, _cache_timestamp
-    
-    # Return cached if still valid
-    if _cache_timestamp and (datetime.now() - _cache_timestamp) < CACHE_DURATION:
-        return _key_cache
-    
+    """Fetch all API keys from Supabase (cached for 5 minutes)."""
+    global _last_good
+
+    with _lock:
+        if 'all' in _cache:
+            return _cache['all']
+
+        try:
+            url = f"{SUPABASE_URL}/rest/v1/admin_api_keys"
+            params = {
+                "select": "service_name,key_name,key_value,is_active",
+                "is_active": "eq.true"
+            }
+
+            response = _http.get(url, params=params)
+
+            if response.status_code == 200:
+                keys = {
+                    f"{key['service_name']}_{key['key_name']}": key['key_value']
+                    for key in response.json()
+                }
+                _cache['all'] = keys
+                _last_good = keys
+                return keys
+        except Exception as e:
+            logger.error("Error fetching API keys: %s", e)
+
+        # Fetch failed - serve the last good snapshot rather than nothing
+        return _last_good
+
+
+# Per-user BYOK keys sit on the analysis hot path, so successful and
+# empty lookups are both cached; writes invalidate eagerly via
+# invalidate_user_key so a freshly saved key is picked up immediately.
+_user_key_cache = TTLCache(maxsize=10000, ttl=600)
+_USER_KEY_MISS = object()
+
+
+def get_user_gemini_key(user_id: str):
+    """
+    Get user's own Gemini API key from database.
+    Returns None if user hasn't set their key.
+    """
+    with _lock:
+        cached = _user_key_cache.get(user_id, _USER_KEY_MISS)
+    if cached is not _USER_KEY_MISS:
+        return cached
+
     try:
-        url = f"{SUPABASE_URL}/rest/v1/admin_api_keys"
-        headers = {
-            "apikey": SUPABASE_KEY,
-            "Authorization": f"Bearer {SUPABASE_KEY}",
-            "Content-Type": "application/json"
-        }
-        params = {
-            "select": "service_name,key_name,key_value,is_active",
-            "is_active": "eq.true"
-        }
-        
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        
+        response = _http.get(
+            f"{SUPABASE_URL}/rest/v1/user_api_keys",
+            params={
+                "user_id": f"eq.{user_id}",
+                "provider": "eq.google_ai_studio",
+                "is_active": "eq.true",
+                "select": "api_key_encrypted"
+            }
+        )
+
         if response.status_code == 200:
-            keys = response.json()
-            _key_cache = {}
-            for key in keys:
-                key_identifier = f"{key['service_name']}_{key['key_name']}"
-                _key_cache[key_identifier] = key['key_value']
-            _cache_timestamp = datetime.now()
-            return _key_cache
+            rows = response.json()
+            # In production, decrypt the key here
+            # For now, we'll store keys in plain text temporarily
+            key = rows[0].get("api_key_encrypted") if rows else None
+            with _lock:
+                _user_key_cache[user_id] = key
+            return key
+        return None
     except Exception as e:
-        print(f"Error fetching API keys: {e}")
-    
-    return _key_cache
+        logger.error("Error fetching user API key: %s", e)
+        return None
+
+
+def invalidate_user_key(user_id: str):
+    """Drop a user's cached BYOK key (called when their key changes)."""
+    with _lock:
+        _user_key_cache.pop(user_id, None)
 
 
 def get_api_key(service_name: str, key_name: str, fallback: str = None) -> str:
@@ -79,6 +149,7 @@ def get_gemini_key(fallback: str = None) -> str:
 
 def clear_cache():
     """Clear the key cache."""
-    global _key_cache, _cache_timestamp
-    _key_cache = {}
-    _cache_timestamp = None
+    global _last_good
+    with _lock:
+        _cache.clear()
+        _last_good = {}
@@ -11,11 +11,24 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
 from reportlab.graphics.shapes import Drawing, Rect
 from reportlab.graphics.charts.barcharts import VerticalBarChart
 from reportlab.graphics.charts.piecharts import Pie
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
 from datetime import datetime
+from typing import Optional
+from xml.sax.saxutils import escape
+import asyncio
+import hashlib
+import io
 import boto3
+import logging
+import orjson
+import os
+from botocore.exceptions import ClientError
 from app.core.config import settings
-import requests
+from app.services.analysis_schema import SkillAnalysis
+from app.services.key_service import get_sync_client
+
+logger = logging.getLogger(__name__)
 
 # Colors
 PRIMARY_COLOR = HexColor("#6366F1")  # Indigo
@@ -74,6 +87,49 @@ def create_styles():
     return styles
 
 
+# Styles never change between reports, so build them once at import and
+# share by identity - TableStyle is immutable once attached to a table
+_STYLES = create_styles()
+
+_SCORE_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), PRIMARY_COLOR),
+    ('TEXTCOLOR', (0, 0), (-1, 0), white),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), LIGHT_BG),
+    ('GRID', (0, 0), (-1, -1), 1, PRIMARY_COLOR)
+])
+
+_MISSING_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), SECONDARY_COLOR),
+    ('TEXTCOLOR', (0, 0), (-1, 0), white),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+    ('BACKGROUND', (0, 1), (-1, -1), white),
+    ('GRID', (0, 0), (-1, -1), 0.5, SECONDARY_COLOR),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [white, LIGHT_BG])
+])
+
+_SCORES_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), PRIMARY_COLOR),
+    ('TEXTCOLOR', (0, 0), (-1, 0), white),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+    ('GRID', (0, 0), (-1, -1), 0.5, PRIMARY_COLOR)
+])
+
+_FOOTER_STYLE = ParagraphStyle(
+    name='Footer', fontSize=8, textColor=HexColor("#666666"), alignment=TA_CENTER
+)
+
+
 def create_skill_bar_chart(skills_data: list[dict], title: str = "Skill Demand") -> Drawing:
     """Create a bar chart showing skill demand/scores."""
     drawing = Drawing(400, 200)
@@ -101,28 +157,34 @@ def create_skill_bar_chart(skills_data: list[dict], title: str = "Skill Demand")
     return drawing
 
 
-def generate_pdf_report(
+def _append_bullets(story: list, items: list, style, marker: str = "•") -> None:
+    """
+    Append a bullet list as one Paragraph with <br/> separators.
+    A single Paragraph costs one XML parse and wrap pass instead of one
+    per bullet, and escape() keeps markup characters in the data inert.
+    """
+    if items:
+        story.append(Paragraph(
+            "<br/>".join(f"{marker} {escape(str(item))}" for item in items),
+            style
+        ))
+
+
+def _build_story(
     user_name: str,
     user_email: str,
     preferred_roles: list[str],
     analysis: dict,
     user_skills: list[dict]
-) -> BytesIO:
-    """
-    Generate a professional PDF report from the skill gap analysis.
-    Returns BytesIO buffer containing the PDF.
-    """
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=1*cm,
-        leftMargin=1*cm,
-        topMargin=1.5*cm,
-        bottomMargin=1.5*cm
-    )
-    
-    styles = create_styles()
+) -> list:
+    """Assemble the report flowables, independent of the output target."""
+    # One validation pass up front replaces the defensive .get chains -
+    # every field below is guaranteed present with a sane default
+    sa = SkillAnalysis.model_validate(analysis)
+    readiness = sa.skill_assessment.market_readiness_score
+    readiness_text = f"{readiness:g}" if readiness is not None else "N/A"
+
+    styles = _STYLES
     story = []
     
     # Title Page
@@ -140,90 +202,75 @@ def generate_pdf_report(
     
     # Executive Summary
     story.append(Paragraph("1. Executive Summary", styles['SectionHeading']))
-    summary = analysis.get("executive_summary", "No summary available.")
+    summary = sa.executive_summary
     story.append(Paragraph(summary, styles['BodyText']))
     story.append(Spacer(1, 0.3*inch))
     
     # Overall Scores Box
-    overall_gap = analysis.get("overall_gap_percentage", 0)
-    overall_fit = analysis.get("overall_fit_score", 0)
+    overall_gap = sa.overall_gap_percentage
+    overall_fit = sa.overall_fit_score
     
     score_data = [
         ["Metric", "Score"],
         ["Overall Fit Score", f"{overall_fit}/100"],
         ["Skill Gap", f"{overall_gap}%"],
-        ["Market Readiness", f"{analysis.get('skill_assessment', {}).get('market_readiness_score', 'N/A')}/10"]
+        ["Market Readiness", f"{readiness_text}/10"]
     ]
     
     score_table = Table(score_data, colWidths=[200, 150])
-    score_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), PRIMARY_COLOR),
-        ('TEXTCOLOR', (0, 0), (-1, 0), white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), LIGHT_BG),
-        ('GRID', (0, 0), (-1, -1), 1, PRIMARY_COLOR)
-    ]))
+    score_table.setStyle(_SCORE_TABLE_STYLE)
     story.append(score_table)
     story.append(Spacer(1, 0.3*inch))
     
     # Market Trends Section
     story.append(Paragraph("2. Current Market Trends", styles['SectionHeading']))
-    market = analysis.get("market_trends", {})
+    market = sa.market_trends
     
     story.append(Paragraph("<b>Top In-Demand Skills:</b>", styles['BodyText']))
-    for skill in market.get("top_skills", [])[:5]:
-        story.append(Paragraph(f"• {skill}", styles['BulletPoint']))
+    _append_bullets(story, market.top_skills[:5], styles['BulletPoint'])
     
     story.append(Spacer(1, 0.2*inch))
     story.append(Paragraph("<b>Growing Technologies:</b>", styles['BodyText']))
-    for tech in market.get("growing_technologies", [])[:5]:
-        story.append(Paragraph(f"• {tech}", styles['BulletPoint']))
+    _append_bullets(story, market.growing_technologies[:5], styles['BulletPoint'])
     
     story.append(Spacer(1, 0.2*inch))
-    story.append(Paragraph(f"<b>Market Direction:</b> {market.get('market_direction', 'N/A')}", styles['BodyText']))
+    story.append(Paragraph(f"<b>Market Direction:</b> {escape(market.market_direction)}", styles['BodyText']))
     
     story.append(PageBreak())
     
     # User's Skill Assessment
     story.append(Paragraph("3. Your Skill Assessment", styles['SectionHeading']))
-    assessment = analysis.get("skill_assessment", {})
+    assessment = sa.skill_assessment
     
-    story.append(Paragraph(f"<b>Market Readiness Score:</b> {assessment.get('market_readiness_score', 'N/A')}/10", styles['BodyText']))
+    story.append(Paragraph(f"<b>Market Readiness Score:</b> {readiness_text}/10", styles['BodyText']))
     story.append(Spacer(1, 0.1*inch))
     
     story.append(Paragraph("<b>Your Strong Skills (aligned with market):</b>", styles['BodyText']))
-    for skill in assessment.get("strong_skills", [])[:8]:
-        story.append(Paragraph(f"✅ {skill}", styles['BulletPoint']))
+    _append_bullets(story, assessment.strong_skills[:8], styles['BulletPoint'], marker="[OK]")
     
     story.append(Spacer(1, 0.2*inch))
     story.append(Paragraph("<b>Skills Needing Improvement:</b>", styles['BodyText']))
-    for skill in assessment.get("needs_improvement", [])[:8]:
-        story.append(Paragraph(f"⚠️ {skill}", styles['BulletPoint']))
+    _append_bullets(story, assessment.needs_improvement[:8], styles['BulletPoint'], marker="[!]")
     
     story.append(PageBreak())
     
     # Gap Analysis for Each Role
     story.append(Paragraph("4. Skill Gap Analysis by Target Role", styles['SectionHeading']))
     
-    for role_analysis in analysis.get("gap_analysis", []):
-        role_name = role_analysis.get("role", "Unknown Role")
-        gap_pct = role_analysis.get("gap_percentage", 0)
+    for role_analysis in sa.gap_analysis:
+        role_name = role_analysis.role
+        gap_pct = role_analysis.gap_percentage
         
         story.append(Paragraph(f"<b>{role_name}</b>", styles['BodyText']))
         story.append(Paragraph(f"Gap: {gap_pct}%", styles['BodyText']))
         
         story.append(Spacer(1, 0.1*inch))
         story.append(Paragraph("Skills You Have:", styles['BodyText']))
-        for skill in role_analysis.get("user_has", [])[:5]:
-            story.append(Paragraph(f"  ✅ {skill}", styles['BulletPoint']))
+        _append_bullets(story, role_analysis.user_has[:5], styles['BulletPoint'], marker="[OK]")
         
         story.append(Spacer(1, 0.1*inch))
         story.append(Paragraph("Skills Missing:", styles['BodyText']))
-        for skill in role_analysis.get("user_missing", [])[:5]:
-            story.append(Paragraph(f"  ❌ {skill}", styles['BulletPoint']))
+        _append_bullets(story, role_analysis.user_missing[:5], styles['BulletPoint'], marker="[X]")
         
         story.append(Spacer(1, 0.3*inch))
     
@@ -233,67 +280,52 @@ def generate_pdf_report(
     story.append(Paragraph("5. Critical Skills to Acquire", styles['SectionHeading']))
     
     missing_data = [["Skill", "Importance", "Learning Difficulty"]]
-    for skill in analysis.get("critical_missing_skills", [])[:10]:
+    for skill in sa.critical_missing_skills[:10]:
         missing_data.append([
-            skill.get("skill", ""),
-            skill.get("importance", ""),
-            skill.get("learning_difficulty", "")
+            skill.skill,
+            skill.importance,
+            skill.learning_difficulty
         ])
     
     if len(missing_data) > 1:
         missing_table = Table(missing_data, colWidths=[180, 100, 120])
-        missing_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), SECONDARY_COLOR),
-            ('TEXTCOLOR', (0, 0), (-1, 0), white),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('BACKGROUND', (0, 1), (-1, -1), white),
-            ('GRID', (0, 0), (-1, -1), 0.5, SECONDARY_COLOR),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [white, LIGHT_BG])
-        ]))
+        missing_table.setStyle(_MISSING_TABLE_STYLE)
         story.append(missing_table)
     
     story.append(PageBreak())
     
     # Recommendations
     story.append(Paragraph("6. Personalized Recommendations", styles['SectionHeading']))
-    recs = analysis.get("recommendations", {})
+    recs = sa.recommendations
     
-    story.append(Paragraph("<b>🚀 Immediate Actions (Next 30 Days):</b>", styles['BodyText']))
-    for action in recs.get("immediate_actions", []):
-        story.append(Paragraph(f"• {action}", styles['BulletPoint']))
+    story.append(Paragraph("<b>Immediate Actions (Next 30 Days):</b>", styles['BodyText']))
+    _append_bullets(story, recs.immediate_actions, styles['BulletPoint'])
     
     story.append(Spacer(1, 0.2*inch))
-    story.append(Paragraph("<b>📅 Short-Term Goals (1-3 Months):</b>", styles['BodyText']))
-    for goal in recs.get("short_term_goals", []):
-        story.append(Paragraph(f"• {goal}", styles['BulletPoint']))
+    story.append(Paragraph("<b>Short-Term Goals (1-3 Months):</b>", styles['BodyText']))
+    _append_bullets(story, recs.short_term_goals, styles['BulletPoint'])
     
     story.append(Spacer(1, 0.2*inch))
-    story.append(Paragraph("<b>🎯 Long-Term Strategy:</b>", styles['BodyText']))
-    story.append(Paragraph(recs.get("long_term_strategy", ""), styles['BodyText']))
+    story.append(Paragraph("<b>Long-Term Strategy:</b>", styles['BodyText']))
+    story.append(Paragraph(escape(recs.long_term_strategy), styles['BodyText']))
     
     story.append(PageBreak())
     
     # Learning Resources
     story.append(Paragraph("7. Recommended Learning Resources", styles['SectionHeading']))
     
-    for resource in analysis.get("learning_resources", [])[:3]:
-        skill_name = resource.get("skill", "")
+    for resource in sa.learning_resources[:3]:
+        skill_name = resource.skill
         story.append(Paragraph(f"<b>{skill_name}</b>", styles['BodyText']))
         
         story.append(Paragraph("Free Resources:", styles['BodyText']))
-        for r in resource.get("free_resources", [])[:3]:
-            story.append(Paragraph(f"  • {r}", styles['BulletPoint']))
+        _append_bullets(story, resource.free_resources[:3], styles['BulletPoint'])
         
         story.append(Paragraph("Paid Courses:", styles['BodyText']))
-        for c in resource.get("paid_courses", [])[:2]:
-            story.append(Paragraph(f"  • {c}", styles['BulletPoint']))
+        _append_bullets(story, resource.paid_courses[:2], styles['BulletPoint'])
         
         story.append(Paragraph("Certifications:", styles['BodyText']))
-        for cert in resource.get("certifications", [])[:2]:
-            story.append(Paragraph(f"  • {cert}", styles['BulletPoint']))
+        _append_bullets(story, resource.certifications[:2], styles['BulletPoint'])
         
         story.append(Spacer(1, 0.2*inch))
     
@@ -302,59 +334,313 @@ def generate_pdf_report(
     story.append(Paragraph("8. Market Competitiveness Scores", styles['SectionHeading']))
     
     scores_data = [["Target Role", "Score", "Assessment"]]
-    for score in analysis.get("competitiveness_scores", []):
+    for score in sa.competitiveness_scores:
         scores_data.append([
-            score.get("role", ""),
-            f"{score.get('score', 0)}/100",
-            score.get("explanation", "")[:50] + "..."
+            score.role,
+            f"{score.score:g}/100",
+            score.explanation[:50] + "..."
         ])
     
     if len(scores_data) > 1:
         scores_table = Table(scores_data, colWidths=[120, 60, 250])
-        scores_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), PRIMARY_COLOR),
-            ('TEXTCOLOR', (0, 0), (-1, 0), white),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('GRID', (0, 0), (-1, -1), 0.5, PRIMARY_COLOR)
-        ]))
+        scores_table.setStyle(_SCORES_TABLE_STYLE)
         story.append(scores_table)
     
     # Key Insights
     story.append(Spacer(1, 0.3*inch))
     story.append(Paragraph("9. Key Insights", styles['SectionHeading']))
-    for insight in analysis.get("key_insights", []):
-        story.append(Paragraph(f"💡 {insight}", styles['BulletPoint']))
+    _append_bullets(story, sa.key_insights, styles['BulletPoint'], marker="*")
     
     # Footer
     story.append(Spacer(1, 0.5*inch))
     story.append(Paragraph(
         "<i>This report was generated by AI-powered analysis and should be used as guidance, not absolute career advice. "
         "Market conditions change rapidly - consider refreshing this report regularly.</i>",
-        ParagraphStyle(name='Footer', fontSize=8, textColor=HexColor("#666666"), alignment=TA_CENTER)
+        _FOOTER_STYLE
     ))
     
-    # Build PDF
-    doc.build(story)
+    return story
+
+
+def _document(target) -> SimpleDocTemplate:
+    """Report document template over any writable target."""
+    return SimpleDocTemplate(
+        target,
+        pagesize=A4,
+        rightMargin=1*cm,
+        leftMargin=1*cm,
+        topMargin=1.5*cm,
+        bottomMargin=1.5*cm
+    )
+
+
+def generate_pdf_report(
+    user_name: str,
+    user_email: str,
+    preferred_roles: list[str],
+    analysis: dict,
+    user_skills: list[dict]
+) -> BytesIO:
+    """
+    Generate a professional PDF report from the skill gap analysis.
+    Returns BytesIO buffer containing the PDF.
+    """
+    buffer = BytesIO()
+    doc = _document(buffer)
+    doc.build(_build_story(user_name, user_email, preferred_roles, analysis, user_skills))
     buffer.seek(0)
     return buffer
 
 
+# doc.build is pure CPU and holds the GIL, so buffered builds run in a
+# process pool instead of a thread. Created lazily - Lambda cold starts
+# shouldn't pay for worker processes that may never be used. On Lambda
+# multiprocessing can't start at all (no /dev/shm for SemLock), so the
+# first failure flips _pdf_pool_unavailable and builds drop to threads.
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_unavailable = False
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _pdf_pool
+
+
+def _build_pdf_bytes(
+    user_name: str,
+    user_email: str,
+    preferred_roles: list[str],
+    analysis: dict,
+    user_skills: list[dict]
+) -> bytes:
+    """Pool worker - returns raw bytes since BytesIO doesn't pickle."""
+    return generate_pdf_report(
+        user_name, user_email, preferred_roles, analysis, user_skills
+    ).getvalue()
+
+
+async def generate_pdf_report_async(
+    user_name: str,
+    user_email: str,
+    preferred_roles: list[str],
+    analysis: dict,
+    user_skills: list[dict]
+) -> BytesIO:
+    """Build the report in the process pool, off the event loop."""
+    global _pdf_pool_unavailable
+
+    if not _pdf_pool_unavailable:
+        try:
+            pdf_bytes = await asyncio.get_running_loop().run_in_executor(
+                _get_pdf_pool(),
+                _build_pdf_bytes,
+                user_name, user_email, preferred_roles, analysis, user_skills
+            )
+            return BytesIO(pdf_bytes)
+        except OSError as e:
+            _pdf_pool_unavailable = True
+            logger.warning("Process pool unavailable (%s); building PDFs on threads", e)
+
+    return await asyncio.to_thread(
+        generate_pdf_report,
+        user_name, user_email, preferred_roles, analysis, user_skills
+    )
+
+
+# S3 multipart parts must be at least 5 MB (except the last)
+_S3_PART_SIZE = 5 * 1024 * 1024
+
+
+class _MultipartSink(io.RawIOBase):
+    """
+    Writable file-like object that streams into an S3 multipart upload.
+    ReportLab writes the document straight into 5 MB part buffers, so the
+    full PDF is never materialized in memory.
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str):
+        self._s3 = s3_client
+        self._bucket = bucket
+        self._key = key
+        self._buffer = bytearray()
+        self._parts = []
+        self.bytes_written = 0
+        self._upload_id = s3_client.create_multipart_upload(
+            Bucket=bucket,
+            Key=key,
+            ContentType='application/pdf',
+            CacheControl='public, max-age=604800, immutable'
+        )["UploadId"]
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._buffer.extend(b)
+        self.bytes_written += len(b)
+        if len(self._buffer) >= _S3_PART_SIZE:
+            self._flush_part()
+        return len(b)
+
+    def _flush_part(self):
+        part_number = len(self._parts) + 1
+        response = self._s3.upload_part(
+            Bucket=self._bucket,
+            Key=self._key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=bytes(self._buffer)
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+        self._buffer.clear()
+
+    def close(self):
+        if self.closed:
+            return
+        if self._buffer or not self._parts:
+            self._flush_part()
+        self._s3.complete_multipart_upload(
+            Bucket=self._bucket,
+            Key=self._key,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": self._parts}
+        )
+        super().close()
+
+    def abort(self):
+        """Drop the pending upload so S3 doesn't bill for orphaned parts."""
+        self._s3.abort_multipart_upload(
+            Bucket=self._bucket,
+            Key=self._key,
+            UploadId=self._upload_id
+        )
+        super().close()
+
+
+def _s3_client():
+    return boto3.client(
+        's3',
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_REGION
+    )
+
+
+# Fields stamped into every analysis after the fact (a fresh timestamp,
+# which key served the call) - excluded from the content hash, or no two
+# payloads would ever dedupe
+_VOLATILE_ANALYSIS_FIELDS = ("report_generated_at", "api_key_source")
+
+
+def _report_content_key(user_email: str, analysis: dict) -> str:
+    """Content-addressed S3 key: same user and analysis, same object."""
+    stable = {k: v for k, v in analysis.items() if k not in _VOLATILE_ANALYSIS_FIELDS}
+    digest = hashlib.blake2b(
+        orjson.dumps({"user": user_email, "analysis": stable}, option=orjson.OPT_SORT_KEYS),
+        digest_size=16
+    ).hexdigest()
+    return f"reports/{digest}.pdf"
+
+
+def generate_pdf_report_to_s3(
+    user_name: str,
+    user_email: str,
+    preferred_roles: list[str],
+    analysis: dict,
+    user_skills: list[dict]
+) -> tuple[str, int]:
+    """
+    Build the PDF and stream it straight into S3 via multipart upload,
+    overlapping generation with the network instead of buffering the
+    whole document first. Keys are content-addressed, so regenerating an
+    unchanged analysis skips the build and upload entirely and just
+    issues a fresh presigned URL. Returns (presigned_url, size_bytes).
+    """
+    s3_client = _s3_client()
+    bucket = settings.AWS_S3_BUCKET
+    key = _report_content_key(user_email, analysis)
+
+    try:
+        head = s3_client.head_object(Bucket=bucket, Key=key)
+        url = s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket, 'Key': key},
+            ExpiresIn=604800
+        )
+        return url, head["ContentLength"]
+    except ClientError:
+        pass
+
+    sink = _MultipartSink(s3_client, bucket, key)
+    try:
+        doc = _document(sink)
+        doc.build(_build_story(user_name, user_email, preferred_roles, analysis, user_skills))
+        sink.close()
+    except Exception:
+        sink.abort()
+        raise
+
+    # Generate presigned URL (valid for 7 days)
+    url = s3_client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': bucket, 'Key': key},
+        ExpiresIn=604800
+    )
+    return url, sink.bytes_written
+
+
+async def render_and_upload_report(
+    user_name: str,
+    user_email: str,
+    preferred_roles: list[str],
+    analysis: dict,
+    user_skills: list[dict],
+    filename: str
+) -> tuple[str, int]:
+    """
+    Build and upload a report in one step. With AWS credentials the build
+    streams straight into an S3 multipart upload; otherwise (or if the
+    stream fails) it falls back to the buffered build plus the regular
+    upload path. Returns (report_url, size_bytes).
+    """
+    if settings.AWS_ACCESS_KEY_ID and settings.AWS_SECRET_ACCESS_KEY:
+        try:
+            return await asyncio.to_thread(
+                generate_pdf_report_to_s3,
+                user_name, user_email, preferred_roles, analysis, user_skills
+            )
+        except Exception as e:
+            logger.error("Streaming S3 upload failed, using buffered path: %s", e)
+
+    pdf_buffer = await generate_pdf_report_async(
+        user_name, user_email, preferred_roles, analysis, user_skills
+    )
+    pdf_size = pdf_buffer.getbuffer().nbytes
+    report_url = await asyncio.to_thread(upload_to_supabase_storage, pdf_buffer, filename)
+    return report_url, pdf_size
+
+
+async def upload_pdf_report(pdf_buffer: BytesIO, filename: str) -> str:
+    """
+    Upload a finished PDF without blocking the event loop.
+    Prefers S3 when AWS credentials are configured (upload_to_s3 already
+    falls back to Supabase Storage on failure); boto3 has no async API,
+    so the blocking client runs on a worker thread.
+    """
+    if settings.AWS_ACCESS_KEY_ID and settings.AWS_SECRET_ACCESS_KEY:
+        return await asyncio.to_thread(upload_to_s3, pdf_buffer, filename)
+    return await asyncio.to_thread(upload_to_supabase_storage, pdf_buffer, filename)
+
+
 def upload_to_s3(pdf_buffer: BytesIO, filename: str) -> str:
     """
     Upload PDF to S3 bucket and return the URL.
     """
     try:
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_REGION
-        )
-        
+        s3_client = _s3_client()
+
         bucket = settings.AWS_S3_BUCKET
         key = f"reports/{filename}"
         
@@ -375,7 +661,7 @@ def upload_to_s3(pdf_buffer: BytesIO, filename: str) -> str:
         return url
         
     except Exception as e:
-        print(f"Error uploading to S3: {e}")
+        logger.error("Error uploading to S3: %s", e)
         # Fallback: store in Supabase Storage
         return upload_to_supabase_storage(pdf_buffer, filename)
 
@@ -385,22 +671,23 @@ def upload_to_supabase_storage(pdf_buffer: BytesIO, filename: str) -> str:
     Fallback: Upload PDF to Supabase Storage bucket.
     """
     try:
-        # Using Supabase Storage API
+        # Using Supabase Storage API, streaming straight from the buffer -
+        # .read() would copy the whole PDF into a bytes object first
         url = f"{settings.SUPABASE_URL}/storage/v1/object/reports/{filename}"
-        headers = {
-            "apikey": settings.SUPABASE_KEY,
-            "Authorization": f"Bearer {settings.SUPABASE_KEY}",
-            "Content-Type": "application/pdf"
-        }
-        
-        response = requests.post(url, headers=headers, data=pdf_buffer.read())
+
+        pdf_buffer.seek(0)
+        response = get_sync_client().post(
+            url,
+            headers={"Content-Type": "application/pdf"},
+            content=pdf_buffer
+        )
         
         if response.status_code in [200, 201]:
             return f"{settings.SUPABASE_URL}/storage/v1/object/public/reports/{filename}"
         else:
-            print(f"Supabase storage error: {response.text}")
+            logger.error("Supabase storage error: status=%s body=%s", response.status_code, response.text)
             return ""
             
     except Exception as e:
-        print(f"Error uploading to Supabase Storage: {e}")
+        logger.error("Error uploading to Supabase Storage: %s", e)
         return ""